@@ -52,6 +52,17 @@ interface PredictionData {
   message: string;
 }
 
+const API_URL = "http://localhost:8000";
+
+// Anchos aproximados (px) del mapa completo y de su miniatura (?size=thumb).
+// Con srcSet el navegador solo baja la miniatura en pantallas angostas; en
+// ambos casos la API entrega WebP si el navegador lo acepta.
+const MAP_WIDTH_PX = 1400;
+const THUMB_WIDTH_PX = 480;
+const mapSrcSet = (pngPath: string) =>
+  `${API_URL}${pngPath}?size=thumb ${THUMB_WIDTH_PX}w, ${API_URL}${pngPath} ${MAP_WIDTH_PX}w`;
+const MAP_SIZES = "(max-width: 1024px) 100vw, 50vw";
+
 export const StormDashboard = () => {
   const [stormList, setStormList] = useState<UniqueStorm[]>([]);
   const [selectedStormId, setSelectedStormId] = useState<string>("");
@@ -344,7 +355,9 @@ export const StormDashboard = () => {
                 <Box className={styles.mapPlaceholder}>
                     {displayData?.images.model ? (
                     <Image
-                        src={`http://localhost:8000${displayData.images.model}`}
+                        src={`${API_URL}${displayData.images.model}`}
+                        srcSet={mapSrcSet(displayData.images.model)}
+                        sizes={MAP_SIZES}
                       alt="Mapa de la tormenta"
                       objectFit="contain"
                       maxHeight="100%"
@@ -365,7 +378,9 @@ export const StormDashboard = () => {
                 <Box className={styles.mapPlaceholder}>
                     {displayData?.images.forecast ? (
                     <Image
-                        src={`http://localhost:8000${displayData.images.forecast}`}
+                        src={`${API_URL}${displayData.images.forecast}`}
+                        srcSet={mapSrcSet(displayData.images.forecast)}
+                        sizes={MAP_SIZES}
                       alt="Mapa de forecast"
                       objectFit="contain"
                       maxHeight="100%"
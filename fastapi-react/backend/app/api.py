@@ -1,14 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, Response
+import asyncio
+import email.utils
+import math
+import mimetypes
 import os
+import re
+import zipfile
 import sys
+import time
 from pymongo import MongoClient
 import json
 from bson import json_util 
-from datetime import datetime 
+from datetime import datetime, timezone
 from bson import ObjectId
+from typing import Optional
 
 # Agregar el directorio backend al path para importar traduccion
 backend_dir = os.path.join(os.path.dirname(__file__), '..')
@@ -29,6 +36,8 @@ from traduccion import (
     predecir_movimiento_organico,
     graficar_mapa
 ) 
+from simplificacion import tolerancia_de_lod, simplificar_indices
+from cache_compartido import CacheCompartido
 
 app = FastAPI()
 
@@ -48,14 +57,52 @@ app.add_middleware(
 MONGO_URI = 'mongodb://localhost:27017/'
 DATABASE_NAME = 'meteorologia_db'
 COLLECTION_NAME = 'eventos'
+PUNTOS_COLLECTION_NAME = 'puntos_trayectoria'
+NOTIFICACIONES_COLLECTION_NAME = 'notificaciones_ingesta'
+# Predicciones por defecto precalculadas al importar (backend/precalcular_predicciones.py)
+PREDICCIONES_COLLECTION_NAME = 'predicciones'
+HORAS_PREDICCION_DEFECTO = 48
+# Cada cuánto revisa el stream si hay snapshots nuevos, y cada cuánto manda un latido
+STREAM_INTERVALO_SEGUNDOS = 2
+STREAM_LATIDO_SEGUNDOS = 15
+# Avisos en cola por cliente; si un cliente no los consume se le desconecta
+STREAM_MAX_PENDIENTES = 100
 
 client = MongoClient(MONGO_URI)
 db = client[DATABASE_NAME]
 collection = db[COLLECTION_NAME]
+# Puntos GeoJSON con índice 2dsphere (los crea data_ingestion/importar_datos.py)
+puntos_collection = db[PUNTOS_COLLECTION_NAME]
+# Avisos de "snapshot ingerido" que publica el importador
+notificaciones_collection = db[NOTIFICACIONES_COLLECTION_NAME]
+predicciones_collection = db[PREDICCIONES_COLLECTION_NAME]
+
+# Cache de lecturas compartido por todos los workers; lo invalida la ingesta
+snapshot_cache = CacheCompartido()
 print("Conectado a MongoDB desde api.py.")
 
 datos_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'datos')
-app.mount("/api/maps", StaticFiles(directory=datos_dir), name="maps")
+# NOTA: Los mapas ya no se montan con StaticFiles; se sirven desde el endpoint
+# /api/maps/{ruta} para poder negociar formato (WebP) y tamaño (miniatura).
+
+# Sufijos de las variantes que generan data_generator.py y traduccion.py.
+# El orden importa: las miniaturas deben comprobarse antes que las completas.
+SUFIJOS_VARIANTE = {
+    '_thumb.webp': 'thumb_webp',
+    '_thumb.png': 'thumb_png',
+    '.webp': 'webp',
+    '.png': 'png',
+}
+TAMANOS_VALIDOS = ('full', 'thumb')
+# Los mapas no cambian una vez generados; el navegador revalida con ETag al vencer
+IMAGEN_MAX_AGE_SEGUNDOS = 3600
+
+# Snapshots de tormentas terminadas, compactados por data_ingestion/compactar_datos.py
+# en un .zip por tormenta que conserva la ruta original de cada archivo.
+archivo_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'archivo', 'datos')
+PATRON_STORM_ID = re.compile(r'[A-Z]{2}\d{6}')
+# Cache del índice (nombres) de cada .zip: ruta -> (mtime, set de nombres)
+_indices_archivo = {}
 
 # Configurar directorio de predicciones
 predicciones_dir = os.path.join(backend_dir, 'predicciones')
@@ -63,18 +110,451 @@ os.makedirs(predicciones_dir, exist_ok=True)
 # NOTA: No montamos /api/predictions aquí porque interferiría con los endpoints
 # En su lugar, usamos un endpoint específico para servir las imágenes
 
-def parse_mongo_json(data):
+def tipo_variante(filename):
+    """Devuelve el tipo de variante de una imagen según su sufijo (o None)."""
+    for sufijo, tipo in SUFIJOS_VARIANTE.items():
+        if filename.endswith(sufijo):
+            return tipo
+    return None
+
+
+def indice_archivo(storm_id):
+    """Regresa (ruta_zip, nombres) del archivo de una tormenta, o (None, set()) si no hay."""
+    zip_path = os.path.join(archivo_dir, f"{storm_id}.zip")
+    try:
+        mtime = os.path.getmtime(zip_path)
+    except OSError:
+        return None, set()
+
+    cache = _indices_archivo.get(zip_path)
+    if not cache or cache[0] != mtime:
+        try:
+            with zipfile.ZipFile(zip_path) as zf:
+                cache = (mtime, set(zf.namelist()))
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"⚠️  No se pudo leer el archivo {zip_path}: {e}")
+            return None, set()
+        _indices_archivo[zip_path] = cache
+    return zip_path, cache[1]
+
+
+def elegir_variante(ruta_png, accept=None, size=None, existe=os.path.isfile):
+    """
+    Escoge el archivo a servir para un PNG original según la cabecera Accept
+    y el parámetro size. Si no existe ninguna variante, regresa el PNG original.
+    `existe` permite buscar también dentro de un archivo .zip.
+    """
+    base, _ = os.path.splitext(ruta_png)
+    acepta_webp = 'image/webp' in (accept or '')
+
+    candidatos = []
+    if size == 'thumb':
+        if acepta_webp:
+            candidatos.append(f"{base}_thumb.webp")
+        candidatos.append(f"{base}_thumb.png")
+    if acepta_webp:
+        candidatos.append(f"{base}.webp")
+    candidatos.append(ruta_png)
+
+    for candidato in candidatos:
+        if existe(candidato):
+            return candidato
+    return None
+
+
+def cabeceras_imagen(etag, mtime):
+    """Cabeceras de cache de una imagen: validadores y Vary: Accept (WebP/PNG)."""
+    return {
+        "ETag": etag,
+        "Last-Modified": email.utils.formatdate(mtime, usegmt=True),
+        "Cache-Control": f"public, max-age={IMAGEN_MAX_AGE_SEGUNDOS}",
+        "Vary": "Accept",
+    }
+
+
+def no_modificada(etag, mtime, if_none_match=None, if_modified_since=None):
+    """True si la copia del cliente sigue vigente (If-None-Match tiene prioridad)."""
+    if if_none_match:
+        etiquetas = [e.strip().removeprefix('W/') for e in if_none_match.split(',')]
+        return '*' in etiquetas or etag in etiquetas
+    if if_modified_since:
+        try:
+            fecha = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= fecha.timestamp()
+    return False
+
+
+def respuesta_no_modificada(cabeceras):
+    return Response(status_code=304, headers=cabeceras)
+
+
+def servir_desde_archivo(ruta, accept=None, size=None, if_none_match=None, if_modified_since=None):
+    """Sirve un mapa que ya fue compactado en el .zip de su tormenta (o None si no está)."""
+    match = PATRON_STORM_ID.search(os.path.basename(ruta))
+    if not match:
+        return None
+    zip_path, nombres = indice_archivo(match.group(0))
+    if not zip_path:
+        return None
+
+    if tipo_variante(ruta) == 'png':
+        miembro = elegir_variante(ruta, accept, size, existe=nombres.__contains__)
+    else:
+        miembro = ruta if ruta in nombres else None
+    if not miembro:
+        return None
+
+    try:
+        zf = zipfile.ZipFile(zip_path)
+    except (OSError, zipfile.BadZipFile):
+        return None
+    with zf:
+        try:
+            info = zf.getinfo(miembro)
+        except KeyError:
+            return None
+        # El CRC del miembro identifica su contenido sin leerlo
+        etag = f'"{info.CRC:08x}-{info.file_size:x}"'
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        cabeceras = cabeceras_imagen(etag, mtime)
+        if no_modificada(etag, mtime, if_none_match, if_modified_since):
+            return respuesta_no_modificada(cabeceras)
+        contenido = zf.read(miembro)
+    media_type = mimetypes.guess_type(miembro)[0] or 'application/octet-stream'
+    return Response(content=contenido, media_type=media_type, headers=cabeceras)
+
+
+def servir_imagen(directorio, ruta, accept=None, size=None, usar_archivo=False,
+                  if_none_match=None, if_modified_since=None):
+    """
+    Resuelve una ruta dentro de `directorio` y la sirve negociando la variante.
+    Con `usar_archivo`, si el archivo ya no está en disco se busca en el .zip de la tormenta.
+    Responde 304 si la copia del cliente (If-None-Match / If-Modified-Since) sigue vigente.
+    """
+    if size is not None and size not in TAMANOS_VALIDOS:
+        raise HTTPException(status_code=400, detail=f"Tamaño no válido: {size}. Usa 'full' o 'thumb'")
+
+    raiz = os.path.realpath(directorio)
+    file_path = os.path.realpath(os.path.join(raiz, ruta))
+    if not file_path.startswith(raiz + os.sep):
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+
+    if tipo_variante(file_path) == 'png':
+        candidato = elegir_variante(file_path, accept, size)
+    else:
+        candidato = file_path if os.path.isfile(file_path) else None
+
+    if candidato:
+        st = os.stat(candidato)
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        cabeceras = cabeceras_imagen(etag, st.st_mtime)
+        if no_modificada(etag, st.st_mtime, if_none_match, if_modified_since):
+            return respuesta_no_modificada(cabeceras)
+        return FileResponse(candidato, headers=cabeceras, stat_result=st)
+
+    if usar_archivo:
+        ruta_relativa = os.path.relpath(file_path, raiz).replace(os.sep, '/')
+        respuesta = servir_desde_archivo(ruta_relativa, accept, size, if_none_match, if_modified_since)
+        if respuesta:
+            return respuesta
+
+    raise HTTPException(status_code=404, detail="Imagen no encontrada")
+
+
+RADIO_TIERRA_KM = 6378.1
+# Mongo une los vértices de un polígono con geodésicas, no con paralelos: los
+# bordes norte y sur se densifican para que sigan la latitud del rectángulo.
+PASO_DENSIFICADO_GRADOS = 1.0
+# Ningún polígono puede medir 180° o más de ancho (Mongo no lo acepta)
+ANCHO_MAX_POLIGONO_GRADOS = 90.0
+# En ±90 todos los vértices de un borde caen en el polo (Mongo los rechaza por
+# duplicados): las latitudes del rectángulo se limitan a este valor
+LATITUD_MAX_POLIGONO = 89.9
+# Formato de texto con el que el frontend espera las fechas del historial
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+
+def validar_coordenadas(lats=(), lons=()):
+    """400 si alguna latitud sale de -90..90 o alguna longitud de -180..180."""
+    if not all(-90 <= lat <= 90 for lat in lats) or not all(-180 <= lon <= 180 for lon in lons):
+        raise HTTPException(status_code=400, detail="Coordenadas fuera de rango (lon -180..180, lat -90..90)")
+
+
+def poligono_rectangulo(min_lon, min_lat, max_lon, max_lat):
+    """Polígono GeoJSON de un rectángulo con los bordes de latitud densificados."""
+    pasos = max(1, int(math.ceil((max_lon - min_lon) / PASO_DENSIFICADO_GRADOS)))
+    lons = [min_lon + (max_lon - min_lon) * i / pasos for i in range(pasos + 1)]
+    anillo = [[lon, min_lat] for lon in lons]
+    anillo += [[lon, max_lat] for lon in reversed(lons)]
+    anillo.append([min_lon, min_lat])
+    return {"type": "Polygon", "coordinates": [anillo]}
+
+
+def poligonos_bbox(min_lon, min_lat, max_lon, max_lat):
+    """
+    Divide un rectángulo en polígonos válidos para $geoWithin: se parte en el
+    antimeridiano si lo cruza (min_lon > max_lon) y en tramos de menos de 180°.
+    """
+    if min_lon > max_lon:
+        tramos = [(min_lon, 180.0), (-180.0, max_lon)]
+    else:
+        tramos = [(min_lon, max_lon)]
+
+    poligonos = []
+    for inicio, fin in tramos:
+        if fin <= inicio:
+            continue
+        partes = max(1, int(math.ceil((fin - inicio) / ANCHO_MAX_POLIGONO_GRADOS)))
+        ancho = (fin - inicio) / partes
+        for i in range(partes):
+            poligonos.append(poligono_rectangulo(inicio + i * ancho, min_lat,
+                                                 inicio + (i + 1) * ancho, max_lat))
+    return poligonos
+
+
+def formatear_historial(history):
+    """Convierte los 'time' datetime de BSON al texto que usa el frontend."""
+    for p in history or []:
+        if isinstance(p.get('time'), datetime):
+            p['time'] = p['time'].strftime(FORMATO_FECHA)
+    return history
+
+
+def formatear_fechas(item):
+    """Formatea history[].time, created_at y forecast.init de un documento."""
+    formatear_historial(item.get('history'))
+    if isinstance(item.get('created_at'), datetime):
+        item['created_at'] = item['created_at'].strftime(FORMATO_FECHA)
+    forecast = item.get('forecast')
+    if forecast and isinstance(forecast.get('init'), datetime):
+        forecast['init'] = forecast['init'].strftime(FORMATO_FECHA)
+    return item
+
+
+def a_utc_naive(fecha):
+    """
+    Las fechas se guardan en Mongo como UTC sin zona horaria (las de tropycal).
+    Una fecha con zona (p. ej. '...T12:00:00-06:00') se pasa a UTC y se le quita
+    la zona, para compararla bien y no mezclar fechas con y sin zona.
+    """
+    if fecha is not None and fecha.tzinfo is not None:
+        return fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def filtro_tiempo(start=None, end=None):
+    """Construye el filtro de Mongo para una ventana de tiempo opcional (en UTC)."""
+    start, end = a_utc_naive(start), a_utc_naive(end)
+    rango = {}
+    if start:
+        rango['$gte'] = start
+    if end:
+        rango['$lte'] = end
+    return {'time': rango} if rango else {}
+
+
+def agrupar_puntos(cursor):
+    """
+    Agrupa los puntos que coinciden con una consulta geoespacial por tormenta.
+    El historial se divide en segmentos de puntos consecutivos (seq contiguo),
+    para que el cliente dibuje solo los tramos que pasaron por la zona.
+    """
+    tormentas = {}
+    for p in cursor:
+        storm = tormentas.setdefault(p['storm_id'], {
+            'id': p['storm_id'],
+            'name': p.get('name'),
+            'history_segments': [],
+            'forecast': []
+        })
+        punto = {
+            'seq': p['seq'],
+            'time': p['time'].strftime(FORMATO_FECHA),
+            'lat': p['location']['coordinates'][1],
+            'lon': p['location']['coordinates'][0],
+            'vmax': p.get('vmax'),
+            'mslp': p.get('mslp'),
+            'type': p.get('type')
+        }
+        if p['kind'] == 'forecast':
+            punto['fhr'] = p.get('fhr')
+            storm['forecast'].append(punto)
+        else:
+            storm['history_segments'].append(punto)
+
+    results = []
+    for storm in tormentas.values():
+        historial = sorted(storm['history_segments'], key=lambda x: x['seq'])
+        segmentos = []
+        for punto in historial:
+            if segmentos and punto['seq'] == segmentos[-1][-1]['seq'] + 1:
+                segmentos[-1].append(punto)
+            else:
+                segmentos.append([punto])
+        storm['history_segments'] = segmentos
+        storm['forecast'].sort(key=lambda x: x['seq'])
+        results.append(storm)
+
+    results.sort(key=lambda x: x['id'])
+    return results
+
+
+def formatear_evento_sse(notificacion):
+    """Convierte una notificación de Mongo en un mensaje Server-Sent Events."""
+    event_id = str(notificacion['_id'])
+    cuerpo = {k: v for k, v in notificacion.items() if k != '_id'}
+    datos = json.dumps(cuerpo, default=str, ensure_ascii=False)
+    return f"id: {event_id}\nevent: {notificacion.get('type', 'message')}\ndata: {datos}\n\n"
+
+
+def leer_notificaciones(desde_id):
+    """Notificaciones publicadas después de `desde_id` (o ninguna si no hay referencia)."""
+    query = {'_id': {'$gt': desde_id}} if desde_id else {}
+    return list(notificaciones_collection.find(query).sort('_id', 1))
+
+
+def ultima_notificacion_id():
+    ultima = notificaciones_collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+    return ultima['_id'] if ultima else None
+
+
+class DifusorNotificaciones:
+    """
+    Un solo sondeo a Mongo por worker, sin importar cuántos clientes SSE haya:
+    la tarea de fondo lee las notificaciones nuevas y las reparte a la cola de
+    cada cliente. Arranca con el primer cliente y se detiene con el último.
+    """
+
+    def __init__(self, intervalo=STREAM_INTERVALO_SEGUNDOS, max_pendientes=STREAM_MAX_PENDIENTES):
+        self.intervalo = intervalo
+        self.max_pendientes = max_pendientes
+        self.colas = set()
+        self.tarea = None
+
+    def suscribir(self):
+        cola = asyncio.Queue(maxsize=self.max_pendientes)
+        self.colas.add(cola)
+        if self.tarea is None or self.tarea.done():
+            self.tarea = asyncio.create_task(self._sondear())
+        return cola
+
+    def cancelar(self, cola):
+        self.colas.discard(cola)
+
+    async def _sondear(self):
+        ultimo_id = await asyncio.to_thread(ultima_notificacion_id)
+        while self.colas:
+            try:
+                nuevas = await asyncio.to_thread(leer_notificaciones, ultimo_id)
+            except Exception as e:
+                print(f"  [ERROR] No se pudieron leer las notificaciones: {e}")
+                nuevas = []
+            for notificacion in nuevas:
+                ultimo_id = notificacion['_id']
+                evento = (ultimo_id, formatear_evento_sse(notificacion))
+                for cola in list(self.colas):
+                    try:
+                        cola.put_nowait(evento)
+                    except asyncio.QueueFull:
+                        # Cliente que no lee: se le desconecta en lugar de acumular memoria
+                        self.colas.discard(cola)
+                        while not cola.empty():
+                            cola.get_nowait()
+                        cola.put_nowait(None)
+            await asyncio.sleep(self.intervalo)
+
+
+difusor_notificaciones = DifusorNotificaciones()
+
+
+def resolver_tolerancia(lod=None, tolerance=None):
+    """Valida lod= / tolerance= y regresa la tolerancia en grados (None = sin simplificar)."""
+    if lod is not None and tolerance is not None:
+        raise HTTPException(status_code=400, detail="Usa 'lod' o 'tolerance', no ambos")
+    if tolerance is not None:
+        if tolerance <= 0:
+            raise HTTPException(status_code=400, detail="'tolerance' debe ser mayor que 0")
+        return tolerance
+    if lod is not None:
+        try:
+            return tolerancia_de_lod(lod)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return None
+
+
+def simplificar_historial(item, tolerancia):
+    """
+    Simplifica item['history'] con la tolerancia dada. Usa los índices que
+    precalculó el importador si coinciden; si no (tolerancia libre o historial
+    recortado por rango), los calcula al momento.
+    """
+    lod_precalculado = item.pop('history_lod', None) or []
+    history = item.get('history')
+    if tolerancia is None or not history:
+        return item
+
+    indices = None
+    for nivel in lod_precalculado:
+        if nivel['tolerance'] == tolerancia and nivel.get('n') == len(history):
+            indices = nivel['indices']
+            break
+    if indices is None:
+        indices = simplificar_indices(history, tolerancia)
+    item['history'] = [history[i] for i in indices]
+    return item
+
+
+def respuesta_prediccion(storm_id, snapshot, predicciones, filename, precalculada=False, tolerancia=None):
+    """Arma la respuesta de /api/predictions/generate, calculada al momento o precalculada."""
+    base_name, _ = os.path.splitext(filename)
+    history = simplificar_historial(
+        {"history": snapshot.get('history', []), "history_lod": snapshot.get('history_lod')},
+        tolerancia
+    )['history']
+    if tolerancia is not None and predicciones:
+        # La predicción no tiene intensidad: solo se conservan inicio y fin como puntos clave
+        predicciones = [predicciones[i] for i in simplificar_indices(predicciones, tolerancia, con_clave=False)]
+    return {
+        "success": True,
+        "storm_id": storm_id,
+        "history": formatear_historial(history),  # Incluimos el historial para el mapa interactivo
+        "predictions": predicciones,
+        "image_path": f"/api/predictions/image/{filename}",
+        "image_variants": {
+            "webp": f"/api/predictions/image/{base_name}.webp",
+            "thumb_webp": f"/api/predictions/image/{base_name}_thumb.webp",
+            "thumb_png": f"/api/predictions/image/{base_name}_thumb.png"
+        },
+        "precomputed": precalculada,
+        "message": f"Predicción generada exitosamente. Cada punto representa 1 hora."
+    }
+
+
+def parse_mongo_json(data, tolerancia=None):
     results = []
     for item in data:
+        # 0. Trayectoria simplificada (lod=/tolerance=); quita los índices precalculados
+        simplificar_historial(item, tolerancia)
+
         # 1. Conversión de tipos de datos
         if '_id' in item and isinstance(item['_id'], ObjectId):
             item['_id'] = str(item['_id'])
         if 'snapshot_timestamp' in item and isinstance(item['snapshot_timestamp'], datetime):
             item['snapshot_timestamp'] = item['snapshot_timestamp'].isoformat()
+        formatear_fechas(item)
             
         # 2. BÚSQUEDA INTELIGENTE DE IMÁGENES
         # Preparamos un objeto para guardar las imágenes encontradas
-        item['images'] = { "model": None, "forecast": None }
+        # "model" y "forecast" son los PNG originales; "variants" guarda las
+        # URLs de las versiones WebP y miniaturas de cada uno.
+        item['images'] = {
+            "model": None,
+            "forecast": None,
+            "variants": { "model": {}, "forecast": {} }
+        }
         
         # Necesitamos el ID de la tormenta para buscar en los nombres de archivo
         storm_id = item.get('id')
@@ -86,18 +566,35 @@ def parse_mongo_json(data):
             snapshot_folder = item['_id'].split('_', 1)[1]
             mapas_path = os.path.join(datos_dir, snapshot_folder, 'mapas_generados')
             
-            if os.path.isdir(mapas_path):
+            # Lo que sigue en disco más lo que ya se compactó en el .zip de la tormenta
+            # (la compactación es por tormenta: la carpeta puede seguir existiendo
+            # con las imágenes de otras tormentas aún activas)
+            filenames = set(os.listdir(mapas_path)) if os.path.isdir(mapas_path) else set()
+            prefijo = f"{snapshot_folder}/mapas_generados/"
+            _, nombres = indice_archivo(storm_id)
+            filenames.update(n[len(prefijo):] for n in nombres if n.startswith(prefijo))
+
+            if filenames:
                 # Iteramos sobre todos los archivos de la carpeta
-                for filename in os.listdir(mapas_path):
+                for filename in sorted(filenames):
                     # --- ¡AQUÍ ESTÁ LA LÓGICA CLAVE! ---
                     # Comprobamos si el ID de la tormenta está en el nombre del archivo
                     if storm_id in filename:
+                        variante = tipo_variante(filename)
+                        if not variante:
+                            continue
                         url = f"/api/maps/{snapshot_folder}/mapas_generados/{filename}"
                         # Clasificamos la imagen según su nombre
                         if 'modelos' in filename.lower():
-                            item['images']['model'] = url
+                            clave = 'model'
                         elif 'forecast' in filename.lower():
-                            item['images']['forecast'] = url
+                            clave = 'forecast'
+                        else:
+                            continue
+                        if variante == 'png':
+                            item['images'][clave] = url
+                        else:
+                            item['images']['variants'][clave][variante] = url
         except IndexError:
             pass # Si el _id no tiene el formato esperado, no hace nada
 
@@ -115,25 +612,63 @@ async def get_all_events():
     """
     Obtiene todos los snapshots de todos los eventos, ordenados por fecha.
     """
-    # 1. Obtenemos los datos de MongoDB
-    events_cursor = collection.find({}).sort("snapshot_timestamp", 1)
-    
+    # 1. Obtenemos los datos de MongoDB (o del cache compartido)
     # 2. Usamos nuestra función auxiliar para limpiar y formatear los datos
-    results = parse_mongo_json(events_cursor)
+    results = snapshot_cache.obtener(
+        "events:all",
+        lambda: parse_mongo_json(collection.find({}).sort("snapshot_timestamp", 1))
+    )
     
     # 3. FastAPI se encarga de convertir la lista a JSON y enviarla
     return results
 
 @app.get("/api/events/history/{event_id}", tags=["Events"])
-async def get_event_history(event_id: str):
+async def get_event_history(event_id: str, start: Optional[datetime] = None,
+                            end: Optional[datetime] = None, lod: Optional[int] = None,
+                            tolerance: Optional[float] = None):
     """
     Obtiene el historial completo de un evento específico, ordenado por fecha.
+    Con `start` y/o `end` solo devuelve los snapshots con puntos en ese rango,
+    y de cada uno solo los puntos del historial dentro del rango (en UTC; las
+    fechas con zona horaria se convierten).
+    Con `lod` (1-4) o `tolerance` (grados) la trayectoria se simplifica
+    (Douglas-Peucker), conservando cambios de intensidad y la posición actual.
     """
+    tolerancia = resolver_tolerancia(lod, tolerance)
+    start, end = a_utc_naive(start), a_utc_naive(end)
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="'start' debe ser anterior a 'end'")
+
     # 1. Obtenemos los datos de MongoDB
-    history_cursor = collection.find({"id": event_id}).sort("snapshot_timestamp", 1)
+    if start is None and end is None:
+        cargar = lambda: parse_mongo_json(
+            collection.find({"id": event_id}).sort("snapshot_timestamp", 1), tolerancia
+        )
+        if tolerance is not None:
+            # Una tolerancia libre no se guarda: cada valor distinto sería otra entrada
+            return cargar()
+        # Historial completo (o un lod estándar): se sirve desde el cache compartido.
+        # Los IDs sin snapshots no se guardan, para que no llenen el cache.
+        return snapshot_cache.obtener(f"history:{event_id}:{tolerancia}", cargar, guardar_si=bool)
+    else:
+        # El filtro usa el índice (id, history.time) y el recorte se hace en el servidor
+        rango = filtro_tiempo(start, end)['time']
+        condiciones = []
+        if start:
+            condiciones.append({"$gte": ["$$p.time", start]})
+        if end:
+            condiciones.append({"$lte": ["$$p.time", end]})
+        pipeline = [
+            {"$match": {"id": event_id, "history": {"$elemMatch": {"time": rango}}}},
+            {"$sort": {"snapshot_timestamp": 1}},
+            {"$addFields": {"history": {"$filter": {
+                "input": "$history", "as": "p", "cond": {"$and": condiciones}
+            }}}}
+        ]
+        history_cursor = collection.aggregate(pipeline)
     
     # 2. Usamos nuestra función auxiliar para limpiar y formatear los datos
-    results = parse_mongo_json(history_cursor)
+    results = parse_mongo_json(history_cursor, tolerancia)
     
     # 3. FastAPI se encarga de convertir la lista a JSON y enviarla
     return results
@@ -160,21 +695,119 @@ async def get_unique_events():
         { "$sort": { "name": 1 } }
     ]
     
-    events_cursor = collection.aggregate(pipeline)
-    results = parse_mongo_json(events_cursor)
-    return results
+    return snapshot_cache.obtener(
+        "events:unique",
+        lambda: parse_mongo_json(collection.aggregate(pipeline))
+    )
+
+@app.get("/api/geo/bbox", tags=["Geo"])
+async def get_storms_in_bbox(min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+                             start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    Tormentas (y los tramos de su trayectoria) que pasan dentro de un rectángulo,
+    por ejemplo la vista actual del mapa. Acepta una ventana de tiempo opcional.
+    Si min_lon > max_lon el rectángulo cruza el antimeridiano (p. ej. 170 a -170).
+    """
+    validar_coordenadas((min_lat, max_lat), (min_lon, max_lon))
+    if min_lon == max_lon or min_lat >= max_lat:
+        raise HTTPException(status_code=400, detail="El rectángulo no es válido (min debe ser menor que max)")
+    min_lat = max(min_lat, -LATITUD_MAX_POLIGONO)
+    max_lat = min(max_lat, LATITUD_MAX_POLIGONO)
+    if min_lat >= max_lat:
+        raise HTTPException(status_code=400, detail=f"El rectángulo no es válido (queda más allá de ±{LATITUD_MAX_POLIGONO}° de latitud)")
+
+    poligonos = [{"$geoWithin": {"$geometry": p}} for p in poligonos_bbox(min_lon, min_lat, max_lon, max_lat)]
+    if len(poligonos) == 1:
+        query = {"location": poligonos[0]}
+    else:
+        query = {"$or": [{"location": p} for p in poligonos]}
+    query.update(filtro_tiempo(start, end))
+    return agrupar_puntos(puntos_collection.find(query))
+
+@app.get("/api/geo/radius", tags=["Geo"])
+async def get_storms_near(lat: float, lon: float, km: float = 200,
+                          start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    Tormentas que pasaron a menos de `km` kilómetros de un punto
+    (p. ej. "¿qué tormentas pasaron a menos de 200 km de Cancún?").
+    """
+    validar_coordenadas((lat,), (lon,))
+    if km <= 0:
+        raise HTTPException(status_code=400, detail="El radio debe ser mayor que 0")
+
+    query = {
+        "location": {
+            "$geoWithin": {"$centerSphere": [[lon, lat], km / RADIO_TIERRA_KM]}
+        }
+    }
+    query.update(filtro_tiempo(start, end))
+    return agrupar_puntos(puntos_collection.find(query))
+
+@app.get("/api/stream/snapshots", tags=["Stream"])
+async def stream_snapshots(last_event_id: Optional[str] = Header(None)):
+    """
+    Stream Server-Sent Events con un aviso por cada snapshot nuevo que ingiere
+    data_ingestion/importar_datos.py. Cada aviso es un delta pequeño: ID de la
+    tormenta, puntos nuevos del historial y URLs de las imágenes.
+    Si el cliente se reconecta con Last-Event-ID, recibe lo que se perdió.
+    """
+    # Nos suscribimos antes de reponer lo perdido, para no perder nada entre ambos pasos
+    cola = difusor_notificaciones.suscribir()
+    perdidas = []
+    if last_event_id and ObjectId.is_valid(last_event_id):
+        try:
+            perdidas = await asyncio.to_thread(leer_notificaciones, ObjectId(last_event_id))
+        except Exception:
+            difusor_notificaciones.cancelar(cola)
+            raise
+
+    async def generador():
+        ultimo_id = None
+        try:
+            for notificacion in perdidas:
+                ultimo_id = notificacion['_id']
+                yield formatear_evento_sse(notificacion)
+            while True:
+                try:
+                    evento = await asyncio.wait_for(cola.get(), STREAM_LATIDO_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    # Comentario SSE para que proxies no cierren la conexión
+                    yield ": latido\n\n"
+                    continue
+                if evento is None:
+                    break
+                event_id, mensaje = evento
+                if ultimo_id is not None and event_id <= ultimo_id:
+                    continue  # ya se envió al reponer
+                ultimo_id = event_id
+                yield mensaje
+        finally:
+            difusor_notificaciones.cancelar(cola)
+
+    return StreamingResponse(
+        generador(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/api/predictions/generate/{storm_id}", tags=["Predictions"])
-async def generate_prediction(storm_id: str, horas: int = 48):
+async def generate_prediction(storm_id: str, horas: int = HORAS_PREDICCION_DEFECTO,
+                              lod: Optional[int] = None, tolerance: Optional[float] = None):
     """
     Genera una predicción de movimiento para una tormenta específica.
     Utiliza las funciones de traduccion.py para calcular y graficar la predicción.
+    Con las horas por defecto se responde con la predicción precalculada al
+    importar el snapshot, si ya existe. `lod`/`tolerance` simplifican el
+    historial y la predicción devueltos (el mapa siempre usa todos los puntos).
     """
+    tolerancia = resolver_tolerancia(lod, tolerance)
     try:
-        # Obtener el historial más reciente de la tormenta desde MongoDB
-        latest_snapshot = collection.find_one(
-            {"id": storm_id},
-            sort=[("snapshot_timestamp", -1)]
+        # Obtener el historial más reciente de la tormenta (cache compartido o MongoDB).
+        # Un ID que no existe no se guarda, para que no llene el cache.
+        latest_snapshot = snapshot_cache.obtener(
+            f"latest:{storm_id}",
+            lambda: collection.find_one({"id": storm_id}, sort=[("snapshot_timestamp", -1)]),
+            guardar_si=bool
         )
         
         if not latest_snapshot:
@@ -188,8 +821,17 @@ async def generate_prediction(storm_id: str, horas: int = 48):
                 detail="No hay suficiente historial para generar una predicción (se necesitan al menos 2 puntos)"
             )
         
-        # Ordenar el historial por tiempo
-        history.sort(key=lambda x: datetime.strptime(x['time'], "%Y-%m-%d %H:%M:%S"))
+        # El historial ya viene ordenado por tiempo desde el importador
+        
+        # ¿Ya se precalculó la predicción por defecto para este snapshot?
+        if horas == HORAS_PREDICCION_DEFECTO:
+            precalculada = predicciones_collection.find_one(
+                {"_id": latest_snapshot['_id'], "horas": horas}
+            )
+            if precalculada and os.path.exists(os.path.join(predicciones_dir, precalculada['image_filename'])):
+                return respuesta_prediccion(storm_id, latest_snapshot, precalculada['predictions'],
+                                            precalculada['image_filename'], precalculada=True,
+                                            tolerancia=tolerancia)
         
         # Generar predicción usando la función de traduccion.py
         predicciones = predecir_movimiento_organico(history, horas=horas)
@@ -200,28 +842,43 @@ async def generate_prediction(storm_id: str, horas: int = 48):
         # Obtener el nombre del archivo para la URL
         filename = os.path.basename(ruta_imagen)
         
-        return {
-            "success": True,
-            "storm_id": storm_id,
-            "history": history,  # Incluimos el historial para el mapa interactivo
-            "predictions": predicciones,
-            "image_path": f"/api/predictions/image/{filename}",
-            "message": f"Predicción generada exitosamente. Cada punto representa 1 hora."
-        }
+        return respuesta_prediccion(storm_id, latest_snapshot, predicciones, filename,
+                                    tolerancia=tolerancia)
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al generar la predicción: {str(e)}")
 
+@app.get("/api/cache/stats", tags=["Cache"])
+async def get_cache_stats():
+    """
+    Memoria que ocupa el cache compartido de snapshots y aciertos del worker
+    que atiende la petición.
+    """
+    return snapshot_cache.reporte()
+
 @app.get("/api/predictions/image/{filename}", tags=["Predictions"])
-async def get_prediction_image(filename: str):
+async def get_prediction_image(filename: str, size: Optional[str] = None,
+                               accept: Optional[str] = Header(None),
+                               if_none_match: Optional[str] = Header(None),
+                               if_modified_since: Optional[str] = Header(None)):
     """
     Sirve las imágenes de predicción generadas.
+    Con `Accept: image/webp` se sirve la versión WebP, y con `size=thumb` la miniatura.
     """
-    file_path = os.path.join(predicciones_dir, filename)
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Imagen de predicción no encontrada")
-    
-    return FileResponse(file_path)
\ No newline at end of file
+    return servir_imagen(predicciones_dir, filename, accept, size,
+                         if_none_match=if_none_match, if_modified_since=if_modified_since)
+
+@app.get("/api/maps/{ruta:path}", tags=["Maps"])
+async def get_map_image(ruta: str, size: Optional[str] = None,
+                        accept: Optional[str] = Header(None),
+                        if_none_match: Optional[str] = Header(None),
+                        if_modified_since: Optional[str] = Header(None)):
+    """
+    Sirve los mapas generados en datos/. Negocia el formato igual que las
+    imágenes de predicción: WebP vía Accept y miniatura vía size=thumb.
+    Los snapshots ya compactados se leen directamente de su .zip.
+    """
+    return servir_imagen(datos_dir, ruta, accept, size, usar_archivo=True,
+                         if_none_match=if_none_match, if_modified_since=if_modified_since)
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""
+Backtesting (hindcast) del modelo de predicción de traduccion.py.
+
+Repite la predicción desde cada snapshot archivado y la compara con los puntos
+del historial que se observaron después. Calcula el error de trayectoria a
++12/+24/+48 h y permite barrer combinaciones de parámetros del modelo.
+
+Uso:
+    python backtesting.py
+    python backtesting.py --factor-giro 0.001,0.002,0.003 --amplitud-wobble 0,0.03,0.06
+"""
+import os
+import csv
+import json
+import math
+import zipfile
+import argparse
+import itertools
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+from traduccion import (
+    BASE_DIR,
+    FACTOR_GIRO,
+    AMPLITUD_WOBBLE,
+    FRECUENCIA_WOBBLE,
+    PUNTOS_ANALISIS,
+    a_datetime,
+    predecir_movimiento_organico
+)
+from columnar import leer_columnar, columnas_historial
+
+DATOS_DIR = os.path.join(BASE_DIR, '..', 'datos')
+ARCHIVO_DIR = os.path.join(BASE_DIR, '..', 'archivo', 'datos')
+RESULTADOS_DIR = os.path.join(BASE_DIR, 'backtesting')
+
+PLAZOS_HORAS = (12, 24, 48)
+RADIO_TIERRA_KM = 6371.0
+
+# Casos compartidos por cada proceso del pool (se cargan una sola vez en el initializer)
+_casos = []
+
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    """Distancia de gran círculo (haversine) en kilómetros."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dlat = p2 - p1
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(a))
+
+
+def leer_snapshots():
+    """
+    Regresa [(carpeta, data)] de todos los snapshots, en disco y en archivo/ (.zip).
+    Los snapshots columnares conservan el historial en columnas (no se expande).
+    """
+    snapshots = []
+    if os.path.isdir(DATOS_DIR):
+        for carpeta in sorted(os.listdir(DATOS_DIR)):
+            info_path = os.path.join(DATOS_DIR, carpeta, 'info_generada')
+            if not os.path.isdir(info_path):
+                continue
+            for filename in sorted(os.listdir(info_path)):
+                if filename.endswith('.json'):
+                    try:
+                        with open(os.path.join(info_path, filename), 'r') as f:
+                            data = leer_columnar(json.load(f))
+                    except ValueError as e:
+                        # Incluye JSON inválido y versiones de esquema no soportadas
+                        print(f"ERROR: {filename}: {e}")
+                        continue
+                    snapshots.append((carpeta, data))
+
+    if os.path.isdir(ARCHIVO_DIR):
+        for filename in sorted(os.listdir(ARCHIVO_DIR)):
+            if not filename.endswith('.zip'):
+                continue
+            with zipfile.ZipFile(os.path.join(ARCHIVO_DIR, filename)) as zf:
+                for nombre in sorted(zf.namelist()):
+                    if '/info_generada/' in nombre and nombre.endswith('.json'):
+                        try:
+                            data = leer_columnar(json.loads(zf.read(nombre)))
+                        except ValueError as e:
+                            # Incluye JSON inválido y versiones de esquema no soportadas
+                            print(f"ERROR: {filename}:{nombre}: {e}")
+                            continue
+                        snapshots.append((nombre.split('/', 1)[0], data))
+    return snapshots
+
+
+def construir_casos(snapshots):
+    """
+    Arma los casos de prueba. La "verdad" de cada tormenta es la unión de sus
+    historiales (los snapshots más nuevos corrigen a los anteriores). Cada caso
+    es el historial disponible en un snapshot, sin repetir la misma hora inicial.
+    """
+    snapshots = sorted(snapshots, key=lambda x: x[0])
+    observados = {}
+    casos = {}
+    for carpeta, data in snapshots:
+        columnas = columnas_historial(data, ('time', 'lat', 'lon'))
+        if not columnas['time']:
+            continue
+        storm_id = data['id']
+        puntos = sorted(
+            (a_datetime(t), float(lat), float(lon))
+            for t, lat, lon in zip(columnas['time'], columnas['lat'], columnas['lon'])
+        )
+        verdad = observados.setdefault(storm_id, {})
+        for t, lat, lon in puntos:
+            verdad[t] = (lat, lon)
+        if len(puntos) >= 2:
+            # El modelo solo mira los últimos puntos: son los únicos que viajan al pool.
+            # El snapshot más nuevo con la misma hora inicial reemplaza al anterior.
+            ultimos = [{'time': t, 'lat': lat, 'lon': lon} for t, lat, lon in puntos[-PUNTOS_ANALISIS:]]
+            casos[(storm_id, puntos[-1][0])] = (carpeta, ultimos)
+
+    resultado = []
+    for (storm_id, inicio), (carpeta, ultimos) in sorted(casos.items()):
+        objetivos = {}
+        for plazo in PLAZOS_HORAS:
+            observado = observados[storm_id].get(inicio + timedelta(hours=plazo))
+            if observado:
+                objetivos[plazo] = observado
+        if objetivos:
+            resultado.append({'storm_id': storm_id, 'snapshot': carpeta,
+                              'history': ultimos, 'objetivos': objetivos})
+    return resultado
+
+
+def _inicializar(casos):
+    global _casos
+    _casos = casos
+
+
+def _errores(parametros, inicio=0, fin=None):
+    """Errores (km) por plazo del modelo sobre _casos[inicio:fin] con unos parámetros."""
+    horas = max(PLAZOS_HORAS)
+    errores = {plazo: [] for plazo in PLAZOS_HORAS}
+    for caso in _casos[inicio:fin]:
+        predicciones = predecir_movimiento_organico(caso['history'], horas=horas,
+                                                    verbose=False, **parametros)
+        for plazo, (lat, lon) in caso['objetivos'].items():
+            p = predicciones[plazo - 1]
+            errores[plazo].append(distancia_km(p['lat'], p['lon'], lat, lon))
+    return errores
+
+
+def resumir(parametros, errores):
+    fila = dict(parametros)
+    for plazo, lista in errores.items():
+        fila[f'n_{plazo}h'] = len(lista)
+        fila[f'error_medio_{plazo}h_km'] = round(sum(lista) / len(lista), 1) if lista else None
+    return fila
+
+
+def evaluar_parametros(parametros):
+    """Corre el modelo sobre todos los casos con una combinación de parámetros."""
+    return resumir(parametros, _errores(parametros))
+
+
+def _evaluar_tramo(tarea):
+    i, parametros, inicio, fin = tarea
+    return i, _errores(parametros, inicio, fin)
+
+
+def ejecutar_backtesting(rejilla, procesos=None):
+    casos = construir_casos(leer_snapshots())
+    print(f"Casos de prueba: {len(casos)} | Combinaciones de parámetros: {len(rejilla)}")
+    if not casos:
+        return []
+
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1:
+        _inicializar(casos)
+        return [evaluar_parametros(parametros) for parametros in rejilla]
+
+    # Con menos combinaciones que procesos, cada combinación se reparte en
+    # tramos de casos para que ningún proceso se quede sin trabajo
+    tramos = min(len(casos), -(-procesos // len(rejilla)))
+    limites = [len(casos) * k // tramos for k in range(tramos + 1)]
+    tareas = [
+        (i, parametros, limites[k], limites[k + 1])
+        for i, parametros in enumerate(rejilla)
+        for k in range(tramos)
+    ]
+
+    errores = [{plazo: [] for plazo in PLAZOS_HORAS} for _ in rejilla]
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar,
+                             initargs=(casos,)) as pool:
+        chunksize = max(1, len(tareas) // (procesos * 4))
+        for i, parcial in pool.map(_evaluar_tramo, tareas, chunksize=chunksize):
+            for plazo, lista in parcial.items():
+                errores[i][plazo].extend(lista)
+    return [resumir(parametros, e) for parametros, e in zip(rejilla, errores)]
+
+
+def guardar_resumen(filas):
+    os.makedirs(RESULTADOS_DIR, exist_ok=True)
+    timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ruta = os.path.join(RESULTADOS_DIR, f"resumen_{timestamp_str}.csv")
+    with open(ruta, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(filas[0].keys()))
+        writer.writeheader()
+        writer.writerows(filas)
+    return ruta
+
+
+def imprimir_tabla(filas, limite=20):
+    columnas = list(filas[0].keys())
+    print(" | ".join(f"{c:>18}" for c in columnas))
+    for fila in filas[:limite]:
+        print(" | ".join(f"{str(fila[c]):>18}" for c in columnas))
+
+
+def _lista_floats(texto):
+    return [float(x) for x in texto.split(',') if x.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtesting del modelo de predicción.")
+    parser.add_argument('--factor-giro', type=_lista_floats, default=[FACTOR_GIRO])
+    parser.add_argument('--amplitud-wobble', type=_lista_floats, default=[AMPLITUD_WOBBLE])
+    parser.add_argument('--frecuencia-wobble', type=_lista_floats, default=[FRECUENCIA_WOBBLE])
+    parser.add_argument('--procesos', type=int, default=None,
+                        help="Número de procesos del pool (por defecto, uno por CPU)")
+    args = parser.parse_args()
+
+    rejilla = [
+        {'factor_giro': g, 'amplitud_wobble': a, 'frecuencia_wobble': f}
+        for g, a, f in itertools.product(args.factor_giro, args.amplitud_wobble, args.frecuencia_wobble)
+    ]
+    filas = ejecutar_backtesting(rejilla, args.procesos)
+    if not filas:
+        print("No hay casos con observaciones posteriores para evaluar.")
+        return
+
+    # Mejor combinación primero (menor error a 24 h)
+    filas.sort(key=lambda f: (f.get('error_medio_24h_km') is None, f.get('error_medio_24h_km')))
+    imprimir_tabla(filas)
+    print(f"\nResumen guardado en: {guardar_resumen(filas)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import os
+import stat
+import time
+import pickle
+import hashlib
+import tempfile
+
+# --------------------------------------------------------------------------
+# CACHE DE SNAPSHOTS COMPARTIDO ENTRE WORKERS DE UVICORN
+# --------------------------------------------------------------------------
+# Los datos solo cambian cuando corre la ingesta (cada 3 horas), así que las
+# lecturas calientes se sirven desde memoria compartida en lugar de MongoDB.
+# Se usa un directorio en /dev/shm (tmpfs, vive en RAM): todos los workers leen
+# las mismas entradas, en lugar de guardar N copias. Cada entrada se escribe de
+# forma atómica (archivo temporal + os.replace).
+#
+# Invalidación: un archivo 'generacion' con un contador. El importador (y la
+# compactación) lo incrementan con invalidar(); las entradas de generaciones
+# anteriores dejan de leerse y se borran. El TTL es solo una red de seguridad.
+#
+# Tamaño: tmpfs consume RAM, así que el total se limita a max_bytes. Al escribir
+# se borran las entradas vencidas o de otra generación y, si aún se excede el
+# límite, las usadas hace más tiempo (la fecha de acceso se marca en cada hit;
+# la de modificación sigue siendo la de escritura, para el TTL).
+#
+# Seguridad: las entradas se leen con pickle, así que el directorio debe ser
+# solo nuestro. /dev/shm es de escritura para todos: la ruta por defecto lleva
+# el uid y, si el directorio ya existe y no es del usuario (o otros pueden
+# escribir en él), el cache se desactiva en lugar de leer lo que haya dentro.
+
+_DIR_POR_DEFECTO = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+CACHE_DIR = os.environ.get('CACHE_SNAPSHOTS_DIR', os.path.join(_DIR_POR_DEFECTO, f'bellakat_snapshots_{os.getuid()}'))
+CACHE_TTL_SEGUNDOS = int(os.environ.get('CACHE_SNAPSHOTS_TTL', 4 * 3600))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_SNAPSHOTS_MAX_MB', 256)) * 1024 * 1024
+ARCHIVO_GENERACION = 'generacion'
+
+
+def directorio_seguro(directorio):
+    """True si `directorio` es un directorio real, del usuario actual y sin permisos para otros."""
+    try:
+        st = os.lstat(directorio)
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and st.st_mode & 0o077 == 0
+
+
+class CacheCompartido:
+    def __init__(self, directorio=CACHE_DIR, ttl_segundos=CACHE_TTL_SEGUNDOS, max_bytes=CACHE_MAX_BYTES):
+        self.directorio = directorio
+        self.ttl_segundos = ttl_segundos
+        self.max_bytes = max_bytes
+        os.makedirs(directorio, mode=0o700, exist_ok=True)
+        self.activo = directorio_seguro(directorio)
+        if not self.activo:
+            print(f"⚠️  El cache compartido '{directorio}' no es privado de este usuario; se desactiva.")
+        # Contadores de este proceso (cada worker lleva los suyos)
+        self.hits = 0
+        self.misses = 0
+
+    def generacion(self):
+        try:
+            with open(os.path.join(self.directorio, ARCHIVO_GENERACION), 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _ruta(self, clave, generacion):
+        digest = hashlib.sha1(clave.encode('utf-8')).hexdigest()
+        return os.path.join(self.directorio, f"{generacion}_{digest}.pkl")
+
+    def _escribir_atomico(self, ruta, contenido):
+        fd, tmp = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(contenido)
+        os.replace(tmp, ruta)
+
+    def _desalojar(self, generacion):
+        """Borra entradas vencidas o de otra generación y, si hace falta, las menos usadas."""
+        ahora = time.time()
+        entradas = []
+        for filename in os.listdir(self.directorio):
+            if not filename.endswith('.pkl'):
+                continue
+            ruta = os.path.join(self.directorio, filename)
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                continue
+            if not filename.startswith(f"{generacion}_") or ahora - st.st_mtime >= self.ttl_segundos:
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+                continue
+            entradas.append((st.st_atime, st.st_size, ruta))
+
+        total = sum(size for _, size, _ in entradas)
+        for _, size, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+            total -= size
+
+    def obtener(self, clave, cargar, guardar_si=None):
+        """
+        Lectura "read-through": regresa el valor en cache para `clave` o, si no
+        está (o es de otra generación / venció el TTL), lo calcula con `cargar()`
+        y lo guarda para todos los workers. Con `guardar_si`, el valor solo se
+        guarda si `guardar_si(valor)` es verdadero (p. ej. para no guardar vacíos).
+        """
+        if not self.activo:
+            self.misses += 1
+            return cargar()
+        generacion = self.generacion()
+        ruta = self._ruta(clave, generacion)
+        try:
+            st = os.stat(ruta)
+            if time.time() - st.st_mtime < self.ttl_segundos:
+                with open(ruta, 'rb') as f:
+                    valor = pickle.load(f)
+                # Marca de uso para el desalojo, sin tocar la fecha de escritura
+                os.utime(ruta, (time.time(), st.st_mtime))
+                self.hits += 1
+                return valor
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+
+        self.misses += 1
+        valor = cargar()
+        if guardar_si is not None and not guardar_si(valor):
+            return valor
+        try:
+            self._escribir_atomico(ruta, pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+            self._desalojar(generacion)
+        except OSError as e:
+            print(f"⚠️  No se pudo guardar '{clave}' en el cache compartido: {e}")
+        return valor
+
+    def invalidar(self):
+        """Pasa a una nueva generación y borra las entradas anteriores."""
+        if not self.activo:
+            return self.generacion()
+        nueva = self.generacion() + 1
+        self._escribir_atomico(os.path.join(self.directorio, ARCHIVO_GENERACION), str(nueva).encode())
+        for filename in os.listdir(self.directorio):
+            if filename.endswith('.pkl') and not filename.startswith(f"{nueva}_"):
+                try:
+                    os.remove(os.path.join(self.directorio, filename))
+                except OSError:
+                    pass
+        return nueva
+
+    def reporte(self):
+        """Tamaño en memoria compartida y aciertos de este worker."""
+        entradas, total = 0, 0
+        for filename in os.listdir(self.directorio) if self.activo else []:
+            if filename.endswith('.pkl'):
+                entradas += 1
+                total += os.path.getsize(os.path.join(self.directorio, filename))
+        consultas = self.hits + self.misses
+        return {
+            "directorio": self.directorio,
+            "activo": self.activo,
+            "generacion": self.generacion(),
+            "entradas": entradas,
+            "bytes": total,
+            "memoria_mb": round(total / (1024 * 1024), 2),
+            "limite_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "worker_pid": os.getpid(),
+            "worker_hits": self.hits,
+            "worker_misses": self.misses,
+            "worker_tasa_aciertos": round(self.hits / consultas, 3) if consultas else 0.0
+        }
@@ -0,0 +1,66 @@
+# --------------------------------------------------------------------------
+# FORMATO COLUMNAR DE LOS SNAPSHOTS (FORMATO_SNAPSHOT=columnar en dataGen)
+# --------------------------------------------------------------------------
+# En lugar de un diccionario por punto, el historial se guarda como arreglos
+# paralelos por columna, sin sangría:
+#   {"schema": "tormenta-columnar", "schema_version": 1, "id": ..., ...,
+#    "history": {"time": [...], "lat": [...], "lon": [...], ...}}
+# Lo escribe dataGen y lo leen el importador, traduccion.py y el backtesting.
+# Sin dependencias externas, para poder importarlo desde cualquier parte.
+
+ESQUEMA_COLUMNAR = 'tormenta-columnar'
+VERSION_ESQUEMA_COLUMNAR = 1
+VERSIONES_COLUMNAR_SOPORTADAS = (1,)
+COLUMNAS_HISTORIAL = ("time", "lat", "lon", "vmax", "mslp", "type")
+
+
+def a_columnar(data):
+    """Convierte el historial (lista de puntos) en arreglos paralelos con versión de esquema."""
+    historial = data.get("history") or []
+    columnar = {"schema": ESQUEMA_COLUMNAR, "schema_version": VERSION_ESQUEMA_COLUMNAR}
+    columnar.update(data)
+    columnar["history"] = {col: [p.get(col) for p in historial] for col in COLUMNAS_HISTORIAL}
+    return columnar
+
+
+def leer_columnar(data):
+    """
+    Valida la versión de un snapshot columnar y le quita las claves de esquema,
+    dejando el historial como columnas. Los snapshots normales se regresan tal cual.
+    Lanza ValueError si la versión no está soportada.
+    """
+    if data.get('schema') != ESQUEMA_COLUMNAR:
+        return data
+    version = data.pop('schema_version', None)
+    data.pop('schema')
+    if version not in VERSIONES_COLUMNAR_SOPORTADAS:
+        raise ValueError(f"Versión de esquema columnar no soportada: {version}")
+    data['history'] = data.get('history') or {}
+    return data
+
+
+def columnas_historial(data, columnas=COLUMNAS_HISTORIAL):
+    """
+    Historial de un snapshot (ya pasado por leer_columnar) como {columna: lista},
+    sin importar si venía como columnas o como lista de puntos.
+    """
+    historial = data.get('history') or []
+    if isinstance(historial, dict):
+        n = len(next(iter(historial.values()), []))
+        return {col: historial.get(col) or [None] * n for col in columnas}
+    return {col: [p.get(col) for p in historial] for col in columnas}
+
+
+def expandir_columnar(data):
+    """
+    Si el snapshot viene en formato columnar, reconstruye la lista de puntos
+    del historial (lo que guardan MongoDB y el modelo). Los snapshots normales
+    se regresan tal cual.
+    """
+    if data.get('schema') != ESQUEMA_COLUMNAR:
+        return data
+    data = leer_columnar(data)
+    columnas = data['history']
+    nombres = list(columnas.keys())
+    data['history'] = [dict(zip(nombres, fila)) for fila in zip(*columnas.values())]
+    return data
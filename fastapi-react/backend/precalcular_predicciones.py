@@ -0,0 +1,75 @@
+import os
+import sys
+from datetime import datetime
+from pymongo import MongoClient
+
+from traduccion import predecir_movimiento_organico, graficar_mapa
+
+# --- CONFIGURACIÓN ---
+MONGO_URI = 'mongodb://localhost:27017/'
+DATABASE_NAME = 'meteorologia_db'
+COLLECTION_NAME = 'eventos'
+# Predicciones por defecto ya calculadas, una por snapshot (mismo _id que en 'eventos')
+PREDICCIONES_COLLECTION_NAME = 'predicciones'
+# Debe coincidir con el valor por defecto de POST /api/predictions/generate/{storm_id}
+HORAS_PREDICCION_DEFECTO = 48
+# --------------------
+
+
+def precalcular_tormenta(collection, predicciones, storm_id, horas=HORAS_PREDICCION_DEFECTO):
+    """Calcula y guarda la predicción por defecto (y su mapa) del último snapshot de una tormenta."""
+    latest_snapshot = collection.find_one(
+        {"id": storm_id},
+        sort=[("snapshot_timestamp", -1)]
+    )
+    if not latest_snapshot:
+        print(f"  [AVISO] No hay snapshots para {storm_id}.")
+        return False
+
+    history = latest_snapshot.get('history') or []
+    if len(history) < 2:
+        print(f"  [AVISO] {storm_id} no tiene suficiente historial para predecir.")
+        return False
+
+    if predicciones.find_one({'_id': latest_snapshot['_id'], 'horas': horas}, {'_id': 1}):
+        print(f"  [OK] {storm_id} ya tiene predicción para {latest_snapshot['_id']}.")
+        return True
+
+    puntos = predecir_movimiento_organico(history, horas=horas, verbose=False)
+    ruta_imagen = graficar_mapa(history, puntos, storm_id)
+
+    predicciones.update_one(
+        {'_id': latest_snapshot['_id']},
+        {'$set': {
+            'storm_id': storm_id,
+            'snapshot_timestamp': latest_snapshot.get('snapshot_timestamp'),
+            'horas': horas,
+            'predictions': puntos,
+            'image_filename': os.path.basename(ruta_imagen),
+            'created_at': datetime.now()
+        }},
+        upsert=True
+    )
+    print(f"  [OK] Predicción de {storm_id} precalculada ({os.path.basename(ruta_imagen)}).")
+    return True
+
+
+def precalcular_predicciones(storm_ids):
+    client = MongoClient(MONGO_URI)
+    db = client[DATABASE_NAME]
+    collection = db[COLLECTION_NAME]
+    predicciones = db[PREDICCIONES_COLLECTION_NAME]
+
+    print(f"--- Precalculando predicciones para: {', '.join(storm_ids)} ---")
+    for storm_id in storm_ids:
+        try:
+            precalcular_tormenta(collection, predicciones, storm_id)
+        except Exception as e:
+            print(f"  [ERROR] No se pudo precalcular la predicción de {storm_id}: {e}")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    # Uso: python precalcular_predicciones.py AL132025 EP182025 ...
+    precalcular_predicciones(sys.argv[1:])
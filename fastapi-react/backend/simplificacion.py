@@ -0,0 +1,104 @@
+import math
+
+# Tolerancias estándar (en grados) para el parámetro lod=1..4 de la API.
+# lod=0 (o sin lod) significa trayectoria completa.
+TOLERANCIAS_LOD = (0.1, 0.25, 0.5, 1.0)
+
+
+def tolerancia_de_lod(lod):
+    """Traduce un nivel de detalle a su tolerancia en grados (None = sin simplificar)."""
+    if lod == 0:
+        return None
+    if not 1 <= lod <= len(TOLERANCIAS_LOD):
+        raise ValueError(f"lod debe estar entre 0 y {len(TOLERANCIAS_LOD)}")
+    return TOLERANCIAS_LOD[lod - 1]
+
+
+def categoria(vmax):
+    """Categoría Saffir-Simpson a partir del viento en nudos (-1 = DT, 0 = TT)."""
+    if vmax is None:
+        return None
+    for limite, cat in ((34, -1), (64, 0), (83, 1), (96, 2), (113, 3), (137, 4)):
+        if vmax < limite:
+            return cat
+    return 5
+
+
+def _columnas(puntos, *nombres):
+    """Acepta el historial como lista de puntos o como columnas ({'lat': [...], ...})."""
+    if isinstance(puntos, dict):
+        n = len(puntos.get('lat') or [])
+        return [puntos.get(c) or [None] * n for c in nombres]
+    return [[p.get(c) for p in puntos] for c in nombres]
+
+
+def indices_clave(vmaxs, tipos):
+    """
+    Puntos que nunca se eliminan: el primero, el último (posición actual) y
+    aquellos donde cambia la categoría o el tipo de sistema.
+    """
+    n = len(vmaxs)
+    if not n:
+        return set()
+    clave = {0, n - 1}
+    for i in range(1, n):
+        if categoria(vmaxs[i]) != categoria(vmaxs[i - 1]) or tipos[i] != tipos[i - 1]:
+            clave.add(i)
+    return clave
+
+
+def _distancia_a_segmento(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    if dx == 0 and dy == 0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def douglas_peucker(lats, lons, tolerancia):
+    """Índices que conserva Douglas-Peucker (versión iterativa, sin recursión)."""
+    n = len(lats)
+    if n <= 2:
+        return list(range(n))
+
+    ys = [float(v) for v in lats]
+    # Escalamos la longitud para que un grado "mida" lo mismo que en latitud
+    escala_lon = math.cos(math.radians(sum(ys) / n))
+    xs = [float(v) * escala_lon for v in lons]
+
+    conservar = {0, n - 1}
+    pendientes = [(0, n - 1)]
+    while pendientes:
+        inicio, fin = pendientes.pop()
+        ax, ay, bx, by = xs[inicio], ys[inicio], xs[fin], ys[fin]
+        max_dist, max_i = 0.0, None
+        for i in range(inicio + 1, fin):
+            d = _distancia_a_segmento(xs[i], ys[i], ax, ay, bx, by)
+            if d > max_dist:
+                max_dist, max_i = d, i
+        if max_i is not None and max_dist > tolerancia:
+            conservar.add(max_i)
+            pendientes.append((inicio, max_i))
+            pendientes.append((max_i, fin))
+    return sorted(conservar)
+
+
+def simplificar_indices(puntos, tolerancia, con_clave=True):
+    """
+    Douglas-Peucker más los puntos clave (si `con_clave`). `puntos` puede ser
+    una lista de puntos o el historial en columnas (formato columnar).
+    """
+    lats, lons = _columnas(puntos, 'lat', 'lon')
+    indices = set(douglas_peucker(lats, lons, tolerancia))
+    if con_clave:
+        indices |= indices_clave(*_columnas(puntos, 'vmax', 'type'))
+    return sorted(indices)
+
+
+def precalcular_lod(puntos):
+    """Índices simplificados para cada tolerancia estándar, para guardarlos al importar."""
+    n = len(_columnas(puntos, 'lat')[0])
+    return [
+        {'tolerance': t, 'n': n, 'indices': simplificar_indices(puntos, t)}
+        for t in TOLERANCIAS_LOD
+    ]
@@ -24,6 +24,8 @@ import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 from datetime import datetime, timedelta
+from variantes_imagen import guardar_variantes
+from columnar import expandir_columnar
 
 # Ajusta la fecha de la carpeta según corresponda a tus datos actuales
 PATH_TO_JSON = os.path.join(
@@ -39,15 +41,36 @@ OUTPUT_DIR = os.path.join(BASE_DIR, 'predicciones')
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+
+def a_datetime(valor):
+    """Acepta el 'time' como texto (JSON del generador) o como datetime (MongoDB)."""
+    if isinstance(valor, datetime):
+        return valor
+    return datetime.strptime(valor, FORMATO_FECHA)
+
+
 def cargar_datos(filepath):
     if not os.path.exists(filepath):
         print(f"ERROR: No existe el archivo {filepath}")
         return None
     with open(filepath, 'r') as f:
-        return json.load(f)
+        data = json.load(f)
+
+    # Formato columnar: reconstruimos la lista de puntos del historial
+    try:
+        return expandir_columnar(data)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return None
+
+
+# Puntos del final del historial que usa el modelo para el vector inicial
+PUNTOS_ANALISIS = 6
 
 
-def calcular_vector_inicial(history, puntos_analisis=6):
+def calcular_vector_inicial(history, puntos_analisis=PUNTOS_ANALISIS):
     """Calcula velocidad y dirección inicial."""
     if len(history) < 2:
         return 0, 0, 0, 0
@@ -56,8 +79,8 @@ def calcular_vector_inicial(history, puntos_analisis=6):
     lat1, lon1 = float(recent[0]['lat']), float(recent[0]['lon'])
     lat2, lon2 = float(recent[-1]['lat']), float(recent[-1]['lon'])
 
-    t1 = datetime.strptime(recent[0]['time'], "%Y-%m-%d %H:%M:%S")
-    t2 = datetime.strptime(recent[-1]['time'], "%Y-%m-%d %H:%M:%S")
+    t1 = a_datetime(recent[0]['time'])
+    t2 = a_datetime(recent[-1]['time'])
     hours = (t2 - t1).total_seconds() / 3600
 
     if hours == 0:
@@ -69,18 +92,22 @@ def calcular_vector_inicial(history, puntos_analisis=6):
     return v_lat, v_lon, float(recent[-1]['lat']), float(recent[-1]['lon'])
 
 
-def predecir_movimiento_organico(history, horas=48):
+# Factores de simulación por defecto
+FACTOR_GIRO = 0.002  # Coriolis
+AMPLITUD_WOBBLE = 0.03  # Bamboleo
+FRECUENCIA_WOBBLE = 0.5
+
+
+def predecir_movimiento_organico(history, horas=48, factor_giro=FACTOR_GIRO,
+                                 amplitud_wobble=AMPLITUD_WOBBLE,
+                                 frecuencia_wobble=FRECUENCIA_WOBBLE, verbose=True):
     """Genera predicción hora por hora con factores naturales."""
     v_lat, v_lon, curr_lat, curr_lon = calcular_vector_inicial(history)
     predicciones = []
-    current_time_obj = datetime.strptime(history[-1]['time'], "%Y-%m-%d %H:%M:%S")
-
-    # Factores de simulación
-    factor_giro = 0.002  # Coriolis
-    amplitud_wobble = 0.03  # Bamboleo
-    frecuencia_wobble = 0.5
+    current_time_obj = a_datetime(history[-1]['time'])
 
-    print(f"--- Generando 48 puntos de predicción ---")
+    if verbose:
+        print(f"--- Generando {horas} puntos de predicción ---")
 
     for h in range(1, horas + 1):
         # 1. Ajuste de trayectoria (Coriolis + Aceleración al Norte/Este)
@@ -107,7 +134,7 @@ def predecir_movimiento_organico(history, horas=48):
             "step": h,
             "lat": pos_final_lat,
             "lon": pos_final_lon,
-            "time": timestamp.strftime("%Y-%m-%d %H:%M:%S")
+            "time": timestamp.strftime(FORMATO_FECHA)
         })
 
     return predicciones
@@ -215,6 +242,7 @@ def graficar_mapa(history, predictions, storm_id):
     save_path = os.path.join(OUTPUT_DIR, filename)
     plt.savefig(save_path, dpi=120, bbox_inches='tight')
     plt.close()
+    guardar_variantes(save_path)
 
     return save_path
 
@@ -227,7 +255,7 @@ def main():
 
     storm_id = data.get('id', 'STORM')
     history = data.get('history', [])
-    history.sort(key=lambda x: datetime.strptime(x['time'], "%Y-%m-%d %H:%M:%S"))
+    history.sort(key=lambda x: a_datetime(x['time']))
 
     # Generar predicción
     predicciones = predecir_movimiento_organico(history, horas=48)
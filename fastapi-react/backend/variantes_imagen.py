@@ -0,0 +1,33 @@
+import os
+from PIL import Image
+
+# --------------------------------------------------------------------------
+# VARIANTES LIGERAS DE LOS MAPAS (WEBP Y MINIATURAS)
+# --------------------------------------------------------------------------
+# Las usan tanto dataGen (mapas de tropycal) como traduccion.py (mapas de
+# predicción); la API elige la variante según Accept y ?size=.
+ANCHO_MINIATURA = 480
+CALIDAD_WEBP = 80
+
+
+def guardar_variantes(ruta_png):
+    """
+    A partir de un PNG ya guardado genera, junto a él:
+      - <nombre>.webp        (tamaño completo, mucho más ligero)
+      - <nombre>_thumb.webp  (miniatura para listas y móviles)
+      - <nombre>_thumb.png   (miniatura para clientes sin soporte WebP)
+    Regresa True si se generaron.
+    """
+    base, _ = os.path.splitext(ruta_png)
+    try:
+        with Image.open(ruta_png) as img:
+            img.save(f"{base}.webp", "WEBP", quality=CALIDAD_WEBP, method=4)
+
+            miniatura = img.copy()
+            miniatura.thumbnail((ANCHO_MINIATURA, ANCHO_MINIATURA * 4))
+            miniatura.save(f"{base}_thumb.webp", "WEBP", quality=CALIDAD_WEBP, method=4)
+            miniatura.save(f"{base}_thumb.png", "PNG", optimize=True)
+        return True
+    except Exception as e:
+        print(f"⚠️  No se pudieron generar variantes de {os.path.basename(ruta_png)}: {e}")
+        return False
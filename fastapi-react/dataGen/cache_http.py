@@ -0,0 +1,309 @@
+import io
+import os
+import zlib
+import json
+import time
+import hashlib
+import threading
+import urllib.request
+import urllib.error
+import urllib.response
+import http.client
+from contextlib import contextmanager
+
+# --------------------------------------------------------------------------
+# CACHE HTTP EN DISCO PARA LAS DESCARGAS DE TROPYCAL (NHC, MODELOS, SHAPEFILES)
+# --------------------------------------------------------------------------
+# Tropycal descarga lo mismo en cada ciclo. Mientras el cache está instalado,
+# los GET que hace (con urllib o requests) pasan por aquí:
+#   - si la copia en disco es más nueva que el TTL, se sirve sin tocar la red;
+#   - si está vencida, se pregunta al servidor con If-None-Match /
+#     If-Modified-Since y un 304 reutiliza la copia;
+#   - si el servidor falla y tenemos copia vieja, se sirve la copia vieja.
+# El tamaño total se limita borrando primero lo que lleva más tiempo sin usarse.
+
+CACHE_DIR = os.environ.get('CACHE_HTTP_DIR', 'cache_http')
+CACHE_TTL_SEGUNDOS = int(os.environ.get('CACHE_HTTP_TTL', 3600))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_HTTP_MAX_MB', 500)) * 1024 * 1024
+
+
+def _header(headers, nombre):
+    """Busca una cabecera sin distinguir mayúsculas/minúsculas."""
+    for clave, valor in headers.items():
+        if clave.lower() == nombre.lower():
+            return valor
+    return None
+
+
+# Opciones de requests que cambian cómo se hace la petición: si vienen (en la
+# llamada o en la sesión), la petición va directo a la red sin pasar por el cache.
+OPCIONES_SIN_CACHE = ('auth', 'cookies', 'proxies', 'cert', 'data', 'json', 'files', 'stream', 'hooks')
+
+
+def _cacheable_con_requests(session, method, url, kwargs):
+    """True si un Session.request puede servirse desde el cache sin perder opciones."""
+    if method.upper() != 'GET' or not str(url).startswith(('http://', 'https://')):
+        return False
+    if any(kwargs.get(opcion) for opcion in OPCIONES_SIN_CACHE):
+        return False
+    if kwargs.get('verify') not in (None, True) or kwargs.get('allow_redirects', True) is not True:
+        return False
+    if session.auth or len(session.cookies) or session.proxies or session.cert or session.verify is not True:
+        return False
+    return True
+
+
+def _decodificar(headers, body):
+    """
+    Quita la compresión de transporte (gzip/deflate) del cuerpo y sus cabeceras.
+    urllib no descomprime y requests sí: guardando siempre el cuerpo tal cual,
+    ambos reciben lo mismo (p. ej. el HTML de los listados que lee Tropycal).
+    """
+    encoding = (_header(headers, 'Content-Encoding') or '').strip().lower()
+    if encoding not in ('gzip', 'x-gzip', 'deflate'):
+        return headers, body
+    if encoding == 'deflate':
+        try:
+            body = zlib.decompress(body)
+        except zlib.error:
+            body = zlib.decompress(body, -zlib.MAX_WBITS)  # deflate sin cabecera zlib
+    else:
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    headers = {k: v for k, v in headers.items() if k.lower() not in ('content-encoding', 'content-length')}
+    return headers, body
+
+
+class CacheHTTP:
+    def __init__(self, directorio=CACHE_DIR, ttl_segundos=CACHE_TTL_SEGUNDOS, max_bytes=CACHE_MAX_BYTES):
+        self.directorio = directorio
+        self.ttl_segundos = ttl_segundos
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._urlopen_original = urllib.request.urlopen
+        os.makedirs(directorio, exist_ok=True)
+        self.reiniciar_reporte()
+
+    # ------------------------------------------------------------------
+    # Reporte de aciertos / fallos por ciclo
+    # ------------------------------------------------------------------
+    def reiniciar_reporte(self):
+        self.estadisticas = {'hits': 0, 'revalidados': 0, 'misses': 0, 'obsoletos': 0,
+                             'bytes_red': 0, 'bytes_cache': 0}
+
+    def _contar(self, clave, n=1):
+        with self._lock:
+            self.estadisticas[clave] += n
+
+    def reporte(self):
+        e = dict(self.estadisticas)
+        total = e['hits'] + e['revalidados'] + e['misses'] + e['obsoletos']
+        e['peticiones'] = total
+        e['tasa_aciertos'] = round((e['hits'] + e['revalidados'] + e['obsoletos']) / total, 3) if total else 0.0
+        e['tamano_en_disco'] = self._tamano_total()
+        return e
+
+    # ------------------------------------------------------------------
+    # Almacenamiento: <sha256(url)>.body y <sha256(url)>.json (metadatos)
+    # ------------------------------------------------------------------
+    def _rutas(self, url):
+        clave = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directorio, clave)
+        return f"{base}.body", f"{base}.json"
+
+    def _leer(self, url):
+        ruta_body, ruta_meta = self._rutas(url)
+        try:
+            with open(ruta_meta, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(ruta_body, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def _guardar(self, url, meta, body=None):
+        ruta_body, ruta_meta = self._rutas(url)
+        with self._lock:
+            if body is not None:
+                with open(ruta_body + '.tmp', 'wb') as f:
+                    f.write(body)
+                os.replace(ruta_body + '.tmp', ruta_body)
+            with open(ruta_meta + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(ruta_meta + '.tmp', ruta_meta)
+        self._desalojar()
+
+    def _marcar_uso(self, url):
+        # La fecha de modificación del .body sirve como "último uso" para el desalojo
+        ruta_body, _ = self._rutas(url)
+        try:
+            os.utime(ruta_body)
+        except OSError:
+            pass
+
+    def _tamano_total(self):
+        total = 0
+        for filename in os.listdir(self.directorio):
+            if filename.endswith('.body'):
+                total += os.path.getsize(os.path.join(self.directorio, filename))
+        return total
+
+    def _desalojar(self):
+        """Borra las entradas usadas hace más tiempo hasta quedar bajo max_bytes."""
+        with self._lock:
+            entradas = []
+            for filename in os.listdir(self.directorio):
+                if filename.endswith('.body'):
+                    ruta = os.path.join(self.directorio, filename)
+                    st = os.stat(ruta)
+                    entradas.append((st.st_mtime, st.st_size, ruta))
+            total = sum(size for _, size, _ in entradas)
+            for _, size, ruta in sorted(entradas):
+                if total <= self.max_bytes:
+                    break
+                for r in (ruta, ruta[:-len('.body')] + '.json'):
+                    try:
+                        os.remove(r)
+                    except OSError:
+                        pass
+                total -= size
+
+    # ------------------------------------------------------------------
+    # Descarga con validación condicional
+    # ------------------------------------------------------------------
+    def obtener(self, url, headers=None, timeout=None):
+        """Regresa (status, headers_dict, body) de un GET, usando el cache cuando se puede."""
+        meta, body = self._leer(url)
+        ahora = time.time()
+
+        if meta and ahora - meta['fetched_at'] < self.ttl_segundos:
+            self._marcar_uso(url)
+            self._contar('hits')
+            self._contar('bytes_cache', len(body))
+            return meta['status'], meta['headers'], body
+
+        peticion_headers = dict(headers or {})
+        if meta:
+            etag = _header(meta['headers'], 'ETag')
+            last_modified = _header(meta['headers'], 'Last-Modified')
+            if etag:
+                peticion_headers['If-None-Match'] = etag
+            if last_modified:
+                peticion_headers['If-Modified-Since'] = last_modified
+
+        peticion = urllib.request.Request(url, headers=peticion_headers)
+        try:
+            kwargs = {'timeout': timeout} if timeout is not None else {}
+            with self._urlopen_original(peticion, **kwargs) as respuesta:
+                nuevo_body = respuesta.read()
+                status = respuesta.status
+                nuevos_headers = dict(respuesta.headers.items())
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and meta:
+                meta['fetched_at'] = ahora
+                self._guardar(url, meta)
+                self._marcar_uso(url)
+                self._contar('revalidados')
+                self._contar('bytes_cache', len(body))
+                return meta['status'], meta['headers'], body
+            if meta and e.code >= 500:
+                return self._servir_obsoleto(url, meta, body)
+            self._contar('misses')
+            raise
+        except (urllib.error.URLError, OSError):
+            if meta:
+                return self._servir_obsoleto(url, meta, body)
+            raise
+
+        self._contar('misses')
+        self._contar('bytes_red', len(nuevo_body))
+        nuevos_headers, nuevo_body = _decodificar(nuevos_headers, nuevo_body)
+        if status == 200:
+            self._guardar(url, {'url': url, 'status': status, 'headers': nuevos_headers,
+                                'fetched_at': ahora}, nuevo_body)
+        return status, nuevos_headers, nuevo_body
+
+    def _servir_obsoleto(self, url, meta, body):
+        print(f" [cache] Servidor no disponible, usando copia anterior de {url}")
+        self._marcar_uso(url)
+        self._contar('obsoletos')
+        self._contar('bytes_cache', len(body))
+        return meta['status'], meta['headers'], body
+
+    # ------------------------------------------------------------------
+    # Instalación sobre urllib y requests (lo que usa Tropycal)
+    # ------------------------------------------------------------------
+    def _urlopen(self, url, data=None, *args, **kwargs):
+        if isinstance(url, urllib.request.Request):
+            peticion = url
+        else:
+            peticion = urllib.request.Request(url)
+        es_get = data is None and peticion.data is None and peticion.get_method() == 'GET'
+        # Un contexto SSL o certificados propios también van directo a la red
+        opciones_ssl = any(kwargs.get(k) for k in ('context', 'cafile', 'capath'))
+        if not es_get or opciones_ssl or not peticion.full_url.startswith(('http://', 'https://')):
+            return self._urlopen_original(url, data, *args, **kwargs)
+
+        timeout = kwargs.get('timeout', args[0] if args else None)
+        status, headers, body = self.obtener(peticion.full_url, dict(peticion.header_items()), timeout)
+        mensaje = http.client.HTTPMessage()
+        for clave, valor in headers.items():
+            mensaje[clave] = valor
+        return urllib.response.addinfourl(io.BytesIO(body), mensaje, peticion.full_url, status)
+
+    @contextmanager
+    def instalar(self):
+        """Mientras dure el bloque, los GET de urllib y requests pasan por el cache."""
+        urllib.request.urlopen = self._urlopen
+        session_request_original = None
+        try:
+            import requests
+            session_request_original = requests.Session.request
+            cache = self
+
+            def session_request(session, method, url, *args, **kwargs):
+                if args or not _cacheable_con_requests(session, method, url, kwargs):
+                    return session_request_original(session, method, url, *args, **kwargs)
+                headers_peticion = requests.sessions.merge_setting(
+                    kwargs.get('headers'), session.headers,
+                    dict_class=requests.structures.CaseInsensitiveDict
+                )
+                prep = requests.Request('GET', url, params=kwargs.get('params'),
+                                        headers=headers_peticion).prepare()
+                try:
+                    status, headers, body = cache.obtener(prep.url, dict(prep.headers), kwargs.get('timeout'))
+                except urllib.error.HTTPError as e:
+                    # requests no lanza excepción por 4xx/5xx: devolvemos la respuesta tal cual
+                    status = e.code
+                    headers, body = _decodificar(dict(e.headers.items()), e.read())
+                respuesta = requests.models.Response()
+                respuesta.status_code = status
+                respuesta._content = body
+                respuesta.headers = requests.structures.CaseInsensitiveDict(headers)
+                respuesta.url = prep.url
+                respuesta.encoding = requests.utils.get_encoding_from_headers(respuesta.headers)
+                respuesta.request = prep
+                return respuesta
+
+            requests.Session.request = session_request
+        except ImportError:
+            pass
+
+        try:
+            yield self
+        finally:
+            urllib.request.urlopen = self._urlopen_original
+            if session_request_original is not None:
+                import requests
+                requests.Session.request = session_request_original
+
+
+def imprimir_reporte(reporte):
+    print(" Cache HTTP de este ciclo:")
+    print(f"   Peticiones: {reporte['peticiones']} | Hits: {reporte['hits']} | "
+          f"Revalidados (304): {reporte['revalidados']} | Misses: {reporte['misses']} | "
+          f"Copias obsoletas: {reporte['obsoletos']}")
+    print(f"   Tasa de aciertos: {reporte['tasa_aciertos']:.1%} | "
+          f"Descargado: {reporte['bytes_red'] / 1024:.0f} KB | "
+          f"Servido desde cache: {reporte['bytes_cache'] / 1024:.0f} KB | "
+          f"En disco: {reporte['tamano_en_disco'] / (1024 * 1024):.1f} MB")
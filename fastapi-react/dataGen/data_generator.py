@@ -1,13 +1,25 @@
 import os
+import sys
 import json
 from tropycal import realtime
 from datetime import datetime
 import matplotlib.pyplot as plt
 
+# Las variantes WebP/miniatura y el formato columnar son los mismos que usa el backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from variantes_imagen import guardar_variantes
+from columnar import a_columnar
+
 # --------------------------------------------------------------------------
 # FUNCIONES AUXILIARES PARA TRADUCIR EL FORECAST
 # --------------------------------------------------------------------------
-def save_realtime_storm_json(storm, filename):
+# Formato de los JSON de snapshot:
+#   'json'     -> legible, un diccionario por punto del historial (indent=4)
+#   'columnar' -> arreglos paralelos por columna, sin sangría (mucho más compacto)
+FORMATO_SNAPSHOT = os.environ.get('FORMATO_SNAPSHOT', 'json')
+
+def save_realtime_storm_json(storm, filename, formato=None):
+    formato = formato or FORMATO_SNAPSHOT
     data = {
         "id": storm.id, "name": storm.name, "year": storm.year, "basin": storm.basin,
         "invest": storm.invest, "ace": storm.ace, "realtime": storm.realtime, "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "history": []
@@ -33,8 +45,11 @@ def save_realtime_storm_json(storm, filename):
     except:
         data["forecast"] = None
     with open(filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
-    print(f" Datos JSON guardados en {os.path.basename(filename)}")
+        if formato == 'columnar':
+            json.dump(a_columnar(data), f, separators=(',', ':'))
+        else:
+            json.dump(data, f, indent=4)
+    print(f" Datos JSON ({formato}) guardados en {os.path.basename(filename)}")
 
 def save_invest_json(invest, filename):
     data = {
@@ -238,6 +253,7 @@ def generar_datos_tormentas(ruta_mapas, ruta_info):
                     traducir_forecast(ax, storm_name)     # traducir
                     plt.savefig(forecast_path, dpi=150, bbox_inches='tight')
                     plt.close()
+                    guardar_variantes(forecast_path)
                     print(f" Mapa Forecast traducido guardado en {os.path.basename(forecast_path)}")
                 except Exception as e:
                     print(f" No se pudo generar forecast para {storm_name}: {e}")
@@ -250,6 +266,7 @@ def generar_datos_tormentas(ruta_mapas, ruta_info):
                     traducir_modelos(ax, storm_name)
                     plt.savefig(models_path, dpi=150, bbox_inches='tight')
                     plt.close()
+                    guardar_variantes(models_path)
                     print(f" Mapa de Modelos traducido guardado en {os.path.basename(models_path)}")
                 except Exception as e:
                     print(f" No se pudo generar modelos para {storm_name}: {e}")
@@ -6,6 +6,11 @@ from datetime import datetime
 # Paso 1: Importar la función principal desde nuestro otro módulo.
 # PyCharm entenderá esta conexión y te ayudará con el autocompletado.
 from data_generator import generar_datos_tormentas
+from cache_http import CacheHTTP, imprimir_reporte
+
+# Cache HTTP en disco compartido por todos los ciclos (ver cache_http.py).
+# Se configura con CACHE_HTTP_DIR, CACHE_HTTP_TTL (segundos) y CACHE_HTTP_MAX_MB.
+cache_http = CacheHTTP()
 
 def ejecutar_ciclo_de_monitoreo():
     """
@@ -38,8 +43,13 @@ def ejecutar_ciclo_de_monitoreo():
     # --- PASO 1: GENERACIÓN DE DATOS ---
     # Le pasamos las rutas recién creadas al generador.
     print("--- [TAREA] Llamando al módulo de generación de datos de Tropycal ---")
-    generar_datos_tormentas(ruta_mapas, ruta_info)
-    print("--- [TAREA] Módulo de generación finalizado. ---\n")
+    cache_http.reiniciar_reporte()
+    inicio = time.time()
+    with cache_http.instalar():
+        generar_datos_tormentas(ruta_mapas, ruta_info)
+    print(f"--- [TAREA] Módulo de generación finalizado en {time.time() - inicio:.1f} s. ---")
+    imprimir_reporte(cache_http.reporte())
+    print()
 
     # Imprime un pie de página para marcar el final del ciclo.
     print("\n##################################################")
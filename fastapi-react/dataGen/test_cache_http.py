@@ -0,0 +1,153 @@
+import os
+import gzip
+import threading
+import urllib.error
+import urllib.request
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler, BaseHTTPRequestHandler
+
+import pytest
+
+from cache_http import CacheHTTP
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    peticiones = []
+
+    def do_GET(self):
+        _Handler.peticiones.append((self.path, self.headers.get('If-Modified-Since')))
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor(tmp_path):
+    publico = tmp_path / 'publico'
+    publico.mkdir()
+    (publico / 'a.txt').write_bytes(b'a' * 100)
+    (publico / 'b.txt').write_bytes(b'b' * 100)
+    _Handler.peticiones = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), partial(_Handler, directory=str(publico)))
+    hilo = threading.Thread(target=httpd.serve_forever, daemon=True)
+    hilo.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_miss_y_luego_hit_sin_tocar_la_red(servidor, tmp_path):
+    cache = CacheHTTP(str(tmp_path / 'cache'), ttl_segundos=3600)
+    assert cache.obtener(f"{servidor}/a.txt")[2] == b'a' * 100
+    assert cache.obtener(f"{servidor}/a.txt")[2] == b'a' * 100
+    assert len(_Handler.peticiones) == 1
+    reporte = cache.reporte()
+    assert (reporte['misses'], reporte['hits']) == (1, 1)
+
+
+def test_copia_vencida_se_revalida_con_304(servidor, tmp_path):
+    cache = CacheHTTP(str(tmp_path / 'cache'), ttl_segundos=0)
+    cache.obtener(f"{servidor}/a.txt")
+    status, _, body = cache.obtener(f"{servidor}/a.txt")
+    assert (status, body) == (200, b'a' * 100)
+    assert _Handler.peticiones[-1][1] is not None  # mandó If-Modified-Since
+    assert cache.reporte()['revalidados'] == 1
+
+
+def test_404_no_se_guarda(servidor, tmp_path):
+    cache = CacheHTTP(str(tmp_path / 'cache'))
+    for _ in range(2):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            cache.obtener(f"{servidor}/no-existe.txt")
+        assert e.value.code == 404
+    assert len(_Handler.peticiones) == 2
+    assert cache.reporte()['tamano_en_disco'] == 0
+
+
+def test_desalojo_borra_lo_menos_usado(servidor, tmp_path):
+    directorio = tmp_path / 'cache'
+    cache = CacheHTTP(str(directorio), max_bytes=150)
+    cache.obtener(f"{servidor}/a.txt")
+    cache.obtener(f"{servidor}/b.txt")
+    assert cache.reporte()['tamano_en_disco'] == 100
+    cache.obtener(f"{servidor}/b.txt")
+    cache.obtener(f"{servidor}/a.txt")
+    # b.txt seguía en cache; a.txt se tuvo que volver a descargar
+    assert [ruta for ruta, _ in _Handler.peticiones] == ['/a.txt', '/b.txt', '/a.txt']
+    assert len([f for f in os.listdir(directorio) if f.endswith('.body')]) == 1
+
+
+def test_instalar_intercepta_urlopen(servidor, tmp_path):
+    cache = CacheHTTP(str(tmp_path / 'cache'))
+    original = urllib.request.urlopen
+    with cache.instalar():
+        for _ in range(2):
+            with urllib.request.urlopen(f"{servidor}/a.txt", timeout=5) as respuesta:
+                assert respuesta.read() == b'a' * 100
+    assert urllib.request.urlopen is original
+    assert len(_Handler.peticiones) == 1
+
+
+def test_requests_con_opciones_de_sesion_no_usa_cache(servidor, tmp_path):
+    requests = pytest.importorskip('requests')
+    cache = CacheHTTP(str(tmp_path / 'cache'))
+    with cache.instalar():
+        sesion = requests.Session()
+        assert sesion.get(f"{servidor}/a.txt").content == b'a' * 100
+        assert sesion.get(f"{servidor}/a.txt").content == b'a' * 100
+        assert len(_Handler.peticiones) == 1
+
+        sesion.auth = ('usuario', 'clave')
+        sesion.get(f"{servidor}/a.txt")
+        requests.Session().get(f"{servidor}/a.txt", allow_redirects=False)
+    assert len(_Handler.peticiones) == 3
+
+
+HTML_LISTADO = b'<html><a href="AL132025.dat">AL132025.dat</a></html>'
+
+
+class _HandlerGzip(BaseHTTPRequestHandler):
+    """Servidor que comprime con gzip cuando el cliente lo acepta (como los de NHC)."""
+
+    def do_GET(self):
+        body = HTML_LISTADO
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        if 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor_gzip():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _HandlerGzip)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_respuesta_gzip_se_guarda_descomprimida(servidor_gzip, tmp_path):
+    cache = CacheHTTP(str(tmp_path / 'cache'))
+    # Las cabeceras por defecto de requests piden gzip
+    headers = {'Accept-Encoding': 'gzip, deflate'}
+    for _ in range(2):  # miss y luego hit
+        _, respuesta_headers, body = cache.obtener(f"{servidor_gzip}/listado/", headers)
+        assert body == HTML_LISTADO
+        assert 'Content-Encoding' not in respuesta_headers
+    assert cache.reporte()['hits'] == 1
+
+
+def test_requests_recibe_texto_de_respuesta_gzip(servidor_gzip, tmp_path):
+    requests = pytest.importorskip('requests')
+    cache = CacheHTTP(str(tmp_path / 'cache'))
+    with cache.instalar():
+        for _ in range(2):
+            assert requests.get(f"{servidor_gzip}/listado/").text == HTML_LISTADO.decode()
@@ -0,0 +1,205 @@
+import os
+import re
+import sys
+import shutil
+import argparse
+import zipfile
+from datetime import datetime, timedelta
+
+# El cache compartido de la API vive en el backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from cache_compartido import CacheCompartido
+
+# --- CONFIGURACIÓN ---
+# Carpetas de snapshots que se compactan (nombre lógico -> ruta)
+RAICES = {
+    'datos': '../datos',
+    'datosSinTraducir': '../datosSinTraducir',
+}
+# Aquí se guardan los archivos comprimidos: ../archivo/<raiz>/<storm_id>.zip
+# Dentro de cada .zip se conserva la ruta original (<snapshot>/mapas_generados/...),
+# y el directorio central del zip sirve como índice para leer un solo archivo.
+ARCHIVO_DIR = '../archivo'
+
+# Una tormenta se considera terminada si no aparece en ningún snapshot de estos últimos días
+DIAS_TORMENTA_TERMINADA = 3
+# Pasados estos días solo se conservan las imágenes del primer snapshot de cada día
+DIAS_RETENCION_IMAGENES = 30
+# --------------------
+
+PATRON_STORM_ID = re.compile(r'[A-Z]{2}\d{6}')
+FORMATO_CARPETA = "%Y-%m-%d_%H-%M-%S"
+# Las imágenes ya vienen comprimidas; volver a comprimirlas solo gasta CPU
+EXTENSIONES_IMAGEN = ('.png', '.webp')
+
+
+def fecha_snapshot(nombre_carpeta):
+    try:
+        return datetime.strptime(nombre_carpeta, FORMATO_CARPETA)
+    except ValueError:
+        return None
+
+
+def archivos_de_snapshot(raiz, carpeta):
+    """Regresa [(nombre_en_zip, ruta, storm_id)] de los archivos de una carpeta de snapshot."""
+    archivos = []
+    for sub in ('info_generada', 'mapas_generados'):
+        sub_path = os.path.join(raiz, carpeta, sub)
+        if not os.path.isdir(sub_path):
+            continue
+        for filename in sorted(os.listdir(sub_path)):
+            match = PATRON_STORM_ID.search(filename)
+            if match:
+                archivos.append((f"{carpeta}/{sub}/{filename}", os.path.join(sub_path, filename), match.group(0)))
+    return archivos
+
+
+def tormentas_terminadas(raiz, ahora, dias):
+    """IDs de las tormentas cuyo último snapshot es anterior a `ahora - dias`."""
+    ultimo = {}
+    for carpeta in os.listdir(raiz):
+        fecha = fecha_snapshot(carpeta)
+        if not fecha:
+            continue
+        for _, _, storm_id in archivos_de_snapshot(raiz, carpeta):
+            if storm_id not in ultimo or fecha > ultimo[storm_id]:
+                ultimo[storm_id] = fecha
+    limite = ahora - timedelta(days=dias)
+    return {storm_id for storm_id, fecha in ultimo.items() if fecha < limite}
+
+
+def es_imagen(nombre):
+    return nombre.lower().endswith(EXTENSIONES_IMAGEN)
+
+
+def aplicar_retencion(zip_path, ahora, dias, dry_run=False):
+    """
+    Reescribe el archivo quitando las imágenes de más de `dias` días, salvo las
+    del primer snapshot de cada día. Los JSON siempre se conservan.
+    Regresa cuántas imágenes se quitaron.
+    """
+    limite = ahora - timedelta(days=dias)
+    with zipfile.ZipFile(zip_path) as zf:
+        miembros = zf.infolist()
+
+    # Primer snapshot con imágenes de cada día
+    primera_del_dia = {}
+    for info in miembros:
+        carpeta = info.filename.split('/', 1)[0]
+        fecha = fecha_snapshot(carpeta)
+        if fecha and es_imagen(info.filename):
+            dia = fecha.date()
+            if dia not in primera_del_dia or carpeta < primera_del_dia[dia]:
+                primera_del_dia[dia] = carpeta
+    conservar = set(primera_del_dia.values())
+
+    quitar = set()
+    for info in miembros:
+        carpeta = info.filename.split('/', 1)[0]
+        fecha = fecha_snapshot(carpeta)
+        if fecha and fecha < limite and es_imagen(info.filename) and carpeta not in conservar:
+            quitar.add(info.filename)
+
+    if not quitar or dry_run:
+        return len(quitar)
+
+    tmp_path = zip_path + '.tmp'
+    with zipfile.ZipFile(zip_path) as origen, zipfile.ZipFile(tmp_path, 'w') as destino:
+        for info in miembros:
+            if info.filename not in quitar:
+                destino.writestr(info, origen.read(info.filename))
+    os.replace(tmp_path, zip_path)
+    return len(quitar)
+
+
+def compactar_raiz(nombre_raiz, raiz, ahora, dias_terminada, dias_retencion, dry_run=False):
+    if not os.path.isdir(raiz):
+        print(f"  [AVISO] No existe la carpeta '{raiz}'. Saltando.")
+        return
+
+    destino_dir = os.path.join(ARCHIVO_DIR, nombre_raiz)
+    os.makedirs(destino_dir, exist_ok=True)
+
+    terminadas = tormentas_terminadas(raiz, ahora, dias_terminada)
+    print(f"  Tormentas terminadas en '{nombre_raiz}': {', '.join(sorted(terminadas)) or 'ninguna'}")
+
+    # Agrupamos por tormenta los archivos que se van a archivar
+    por_tormenta = {}
+    for carpeta in sorted(os.listdir(raiz)):
+        if not fecha_snapshot(carpeta):
+            continue
+        for nombre, ruta, storm_id in archivos_de_snapshot(raiz, carpeta):
+            if storm_id in terminadas:
+                por_tormenta.setdefault(storm_id, []).append((nombre, ruta))
+
+    for storm_id, archivos in sorted(por_tormenta.items()):
+        zip_path = os.path.join(destino_dir, f"{storm_id}.zip")
+        if dry_run:
+            print(f"  [DRY-RUN] {len(archivos)} archivos de {storm_id} -> {zip_path}")
+            continue
+
+        # La API puede estar leyendo el .zip: se escribe una copia y se reemplaza de golpe
+        tmp_path = zip_path + '.tmp'
+        if os.path.exists(zip_path):
+            shutil.copyfile(zip_path, tmp_path)
+        with zipfile.ZipFile(tmp_path, 'a') as zf:
+            existentes = set(zf.namelist())
+            for nombre, ruta in archivos:
+                if nombre in existentes:
+                    continue
+                compresion = zipfile.ZIP_STORED if es_imagen(nombre) else zipfile.ZIP_DEFLATED
+                zf.write(ruta, nombre, compress_type=compresion)
+        os.replace(tmp_path, zip_path)
+
+        # Solo borramos los originales una vez cerrado (y escrito) el zip
+        for _, ruta in archivos:
+            os.remove(ruta)
+        print(f"  [OK] {len(archivos)} archivos de {storm_id} archivados en {zip_path}")
+
+    # Carpetas de snapshot que quedaron vacías
+    if not dry_run:
+        for carpeta in os.listdir(raiz):
+            carpeta_path = os.path.join(raiz, carpeta)
+            if not fecha_snapshot(carpeta) or not os.path.isdir(carpeta_path):
+                continue
+            for sub in os.listdir(carpeta_path):
+                sub_path = os.path.join(carpeta_path, sub)
+                if os.path.isdir(sub_path) and not os.listdir(sub_path):
+                    os.rmdir(sub_path)
+            if not os.listdir(carpeta_path):
+                os.rmdir(carpeta_path)
+
+    # Retención de imágenes sobre todos los archivos de esta raíz
+    for filename in sorted(os.listdir(destino_dir)):
+        if filename.endswith('.zip'):
+            quitadas = aplicar_retencion(os.path.join(destino_dir, filename), ahora, dias_retencion, dry_run)
+            if quitadas:
+                prefijo = "[DRY-RUN] Se quitarían" if dry_run else "[OK] Quitadas"
+                print(f"  {prefijo} {quitadas} imágenes antiguas de {filename}")
+
+
+def compactar_datos(dias_terminada=DIAS_TORMENTA_TERMINADA, dias_retencion=DIAS_RETENCION_IMAGENES,
+                    dry_run=False, ahora=None):
+    ahora = ahora or datetime.now()
+    for nombre_raiz, raiz in RAICES.items():
+        print(f"\n--- Compactando '{nombre_raiz}' ---")
+        compactar_raiz(nombre_raiz, raiz, ahora, dias_terminada, dias_retencion, dry_run)
+
+    # Las URLs de imágenes en cache pueden apuntar a archivos que se movieron
+    if not dry_run:
+        CacheCompartido().invalidar()
+    print("\n--- Compactación finalizada. ---")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Archiva los snapshots de tormentas terminadas en un .zip por tormenta."
+    )
+    parser.add_argument('--dias-terminada', type=int, default=DIAS_TORMENTA_TERMINADA,
+                        help="Días sin snapshots para considerar terminada una tormenta")
+    parser.add_argument('--dias-retencion', type=int, default=DIAS_RETENCION_IMAGENES,
+                        help="Días tras los cuales solo se guarda una imagen por día")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Solo muestra lo que se haría, sin mover ni borrar nada")
+    args = parser.parse_args()
+    compactar_datos(args.dias_terminada, args.dias_retencion, args.dry_run)
@@ -1,91 +1,386 @@
 import os
+import sys
 import json
-from pymongo import MongoClient
-from datetime import datetime
+import argparse
+import zipfile
+import subprocess
+from pymongo import MongoClient, UpdateOne, GEOSPHERE, ASCENDING
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+# Módulos ligeros del backend (sin dependencias): trayectorias, cache y formato columnar
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+from simplificacion import precalcular_lod
+from cache_compartido import CacheCompartido
+from columnar import expandir_columnar
 
 # --- CONFIGURACIÓN ---
 # La ruta a tu carpeta principal "datos"
 ROOT_DIR = '../datos' 
+# Snapshots de tormentas terminadas que data_ingestion/compactar_datos.py movió
+# a un .zip por tormenta (conservan la ruta <snapshot>/info_generada/...)
+ARCHIVO_DIR = '../archivo/datos'
 
 # Conexión a MongoDB (si lo tienes en local, esta es la URL por defecto)
 MONGO_URI = 'mongodb://localhost:27017/'
 DATABASE_NAME = 'meteorologia_db'
 COLLECTION_NAME = 'eventos'
+# Un documento por punto de trayectoria (historial y pronóstico), con índice 2dsphere
+PUNTOS_COLLECTION_NAME = 'puntos_trayectoria'
+# Colección "capped" donde se publica un aviso por cada snapshot nuevo.
+# La API la lee para empujar los cambios a los clientes (SSE).
+NOTIFICACIONES_COLLECTION_NAME = 'notificaciones_ingesta'
+NOTIFICACIONES_TAMANO_BYTES = 16 * 1024 * 1024
+# Script que calcula en segundo plano la predicción por defecto de cada tormenta actualizada
+PRECALCULO_SCRIPT = os.path.join(BACKEND_DIR, 'precalcular_predicciones.py')
 # --------------------
 
-def procesar_datos():
+def lanzar_precalculo(storm_ids):
+    """
+    Lanza en segundo plano el precálculo de predicciones (y mapas) para las
+    tormentas con snapshot nuevo, sin esperar a que termine.
+    """
+    if not storm_ids:
+        return None
+    backend_dir = os.path.dirname(PRECALCULO_SCRIPT)
+    print(f"\nLanzando precálculo de predicciones para: {', '.join(sorted(storm_ids))}")
+    return subprocess.Popen(
+        [sys.executable, PRECALCULO_SCRIPT, *sorted(storm_ids)],
+        cwd=backend_dir,
+        start_new_session=True
+    )
+
+
+def obtener_notificaciones(db):
+    """Devuelve la colección capped de notificaciones, creándola si no existe."""
+    if NOTIFICACIONES_COLLECTION_NAME not in db.list_collection_names():
+        db.create_collection(
+            NOTIFICACIONES_COLLECTION_NAME,
+            capped=True,
+            size=NOTIFICACIONES_TAMANO_BYTES
+        )
+    return db[NOTIFICACIONES_COLLECTION_NAME]
+
+
+def urls_imagenes(snapshot_folder_name, event_id, imagenes):
+    """URLs (servidas por /api/maps) de las imágenes de una tormenta en un snapshot."""
+    return [
+        f"/api/maps/{snapshot_folder_name}/mapas_generados/{filename}"
+        for filename in sorted(imagenes)
+        if event_id in filename
+    ]
+
+
+def _leer_json(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _leer_json_zip(zip_path, nombre):
+    with zipfile.ZipFile(zip_path) as zf:
+        return json.loads(zf.read(nombre))
+
+
+def snapshots_por_carpeta(ya_importados=None):
+    """
+    Reúne los JSON de cada carpeta de snapshot, estén en ROOT_DIR o ya
+    compactados en ARCHIVO_DIR/<storm_id>.zip, para reimportar también las
+    tormentas terminadas. Regresa {carpeta: {json_filename: cargar}} y
+    {carpeta: [nombres de imágenes]}; cargar() regresa el JSON ya leído.
+
+    `ya_importados(storm_id)` regresa los _id que ya están en MongoDB: esos
+    snapshots archivados se omiten, para que cada importación no vuelva a leer
+    todo el archivo (sin él se reimporta completo).
+    """
+    archivos, imagenes = {}, {}
+
+    if os.path.isdir(ARCHIVO_DIR):
+        for zip_filename in sorted(os.listdir(ARCHIVO_DIR)):
+            if not zip_filename.endswith('.zip'):
+                continue
+            zip_path = os.path.join(ARCHIVO_DIR, zip_filename)
+            storm_id = zip_filename[:-len('.zip')]
+            omitir = ya_importados(storm_id) if ya_importados else set()
+            try:
+                with zipfile.ZipFile(zip_path) as zf:
+                    for nombre in zf.namelist():
+                        partes = nombre.split('/')
+                        if len(partes) != 3:
+                            continue
+                        carpeta, sub, filename = partes
+                        if sub == 'info_generada' and filename.endswith('.json'):
+                            if f"{storm_id}_{carpeta}" in omitir:
+                                continue
+                            archivos.setdefault(carpeta, {})[filename] = partial(_leer_json_zip, zip_path, nombre)
+                        elif sub == 'mapas_generados':
+                            imagenes.setdefault(carpeta, []).append(filename)
+            except zipfile.BadZipFile:
+                print(f"  [ERROR] El archivo '{zip_filename}' no es un .zip válido. Saltando.")
+
+    # Lo que sigue en disco tiene prioridad sobre lo archivado
+    for carpeta in os.listdir(ROOT_DIR):
+        snapshot_path = os.path.join(ROOT_DIR, carpeta)
+        if not os.path.isdir(snapshot_path):
+            continue
+        info_path = os.path.join(snapshot_path, 'info_generada')
+        if not os.path.exists(info_path):
+            if carpeta not in archivos:
+                print(f"  [AVISO] No se encontró la carpeta 'info_generada' en '{carpeta}'.")
+            continue
+        for json_filename in os.listdir(info_path):
+            if json_filename.endswith('.json'):
+                archivos.setdefault(carpeta, {})[json_filename] = partial(
+                    _leer_json, os.path.join(info_path, json_filename))
+        mapas_path = os.path.join(snapshot_path, 'mapas_generados')
+        if os.path.isdir(mapas_path):
+            imagenes.setdefault(carpeta, []).extend(os.listdir(mapas_path))
+
+    return archivos, imagenes
+
+
+def notificacion_snapshot(collection, data, unique_doc_id, snapshot_datetime, imagenes):
+    """
+    Arma el aviso "snapshot ingerido" con solo lo nuevo: los puntos del
+    historial posteriores al último punto que ya conocíamos y las imágenes.
+    Se publica al final de la importación, ya invalidado el cache de la API.
+    """
+    event_id = data.get('id')
+    anterior = collection.find_one(
+        {'id': event_id, 'snapshot_timestamp': {'$lt': snapshot_datetime}},
+        {'history': {'$slice': -1}},
+        sort=[('snapshot_timestamp', -1)]
+    )
+    ultimo_tiempo = None
+    if anterior and anterior.get('history'):
+        ultimo_tiempo = _parse_fecha(anterior['history'][-1]['time'])
+
+    historial = data.get('history') or []
+    nuevos = [p for p in historial if ultimo_tiempo is None or p['time'] > ultimo_tiempo]
+
+    return {
+        'type': 'snapshot_ingested',
+        'storm_id': event_id,
+        'name': data.get('name'),
+        'snapshot_id': unique_doc_id,
+        'snapshot_timestamp': snapshot_datetime,
+        'new_points': nuevos,
+        'images': imagenes,
+        'created_at': datetime.now()
+    }
+
+
+def crear_indices_eventos(collection):
+    """Índices para el historial por tormenta y para consultas por rango de tiempo."""
+    collection.create_index([('id', ASCENDING), ('snapshot_timestamp', ASCENDING)])
+    collection.create_index([('id', ASCENDING), ('history.time', ASCENDING)])
+
+
+def crear_indices_geo(puntos):
+    """Crea (si no existen) los índices para consultas por zona y por tiempo."""
+    puntos.create_index([('location', GEOSPHERE), ('time', ASCENDING)])
+    puntos.create_index([('storm_id', ASCENDING), ('kind', ASCENDING), ('time', ASCENDING)])
+
+
+def _parse_fecha(valor):
+    """
+    Convierte 'YYYY-MM-DD HH:MM:SS' (o str(datetime) de Tropycal) a datetime
+    UTC sin zona horaria, que es como se guardan y consultan todas las fechas.
+    """
+    fecha = valor if isinstance(valor, datetime) else datetime.fromisoformat(str(valor))
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def normalizar_fechas(data):
+    """
+    Guarda las fechas como datetime nativo de BSON en lugar de texto:
+    history[].time, created_at y forecast.init. El historial queda además
+    ordenado por tiempo, así la API no tiene que ordenarlo en cada petición.
+    """
+    if data.get('created_at'):
+        data['created_at'] = _parse_fecha(data['created_at'])
+
+    historial = data.get('history')
+    if historial:
+        for p in historial:
+            p['time'] = _parse_fecha(p['time'])
+        historial.sort(key=lambda p: p['time'])
+
+    forecast = data.get('forecast')
+    if forecast and forecast.get('init'):
+        forecast['init'] = _parse_fecha(forecast['init'])
+    return data
+
+
+def _punto_geojson(storm_id, name, kind, seq, time, lat, lon, extra):
+    doc = {
+        'storm_id': storm_id,
+        'name': name,
+        'kind': kind,
+        'seq': seq,
+        'time': time,
+        'location': {'type': 'Point', 'coordinates': [float(lon), float(lat)]},
+    }
+    doc.update(extra)
+    return doc
+
+
+def indexar_puntos(puntos, data, snapshot_datetime):
+    """
+    Guarda los puntos del historial y del pronóstico de un snapshot como GeoJSON.
+    - Historial: un documento por (tormenta, hora); snapshots más nuevos lo sobrescriben.
+    - Pronóstico: solo se conserva el del snapshot más reciente de cada tormenta.
+    """
+    storm_id = data.get('id')
+    name = data.get('name')
+    operaciones = []
+
+    for seq, p in enumerate(data.get('history') or []):
+        if p.get('lat') is None or p.get('lon') is None:
+            continue
+        time = _parse_fecha(p['time'])
+        doc = _punto_geojson(storm_id, name, 'history', seq, time, p['lat'], p['lon'], {
+            'vmax': p.get('vmax'), 'mslp': p.get('mslp'), 'type': p.get('type'),
+            'snapshot_timestamp': snapshot_datetime,
+        })
+        operaciones.append(UpdateOne(
+            {'_id': f"{storm_id}_H_{time:%Y-%m-%d %H:%M:%S}"}, {'$set': doc}, upsert=True
+        ))
+
+    # El pronóstico se reemplaza completo; si el snapshot ya no trae uno, el anterior se borra
+    puntos.delete_many({'storm_id': storm_id, 'kind': 'forecast'})
+    forecast = data.get('forecast')
+    if forecast:
+        init = _parse_fecha(forecast['init'])
+        for seq, fhr in enumerate(forecast.get('fhr') or []):
+            lat, lon = forecast['lat'][seq], forecast['lon'][seq]
+            if lat is None or lon is None:
+                continue
+            doc = _punto_geojson(storm_id, name, 'forecast', seq, init + timedelta(hours=fhr), lat, lon, {
+                'fhr': fhr, 'vmax': forecast['vmax'][seq], 'mslp': forecast['mslp'][seq],
+                'type': forecast['type'][seq], 'snapshot_timestamp': snapshot_datetime,
+            })
+            operaciones.append(UpdateOne(
+                {'_id': f"{storm_id}_F_{fhr}"}, {'$set': doc}, upsert=True
+            ))
+
+    if operaciones:
+        puntos.bulk_write(operaciones, ordered=False)
+    return len(operaciones)
+
+
+def procesar_datos(reimportar_archivo=False):
+    """
+    Importa los snapshots de ROOT_DIR y los archivados que aún no están en
+    MongoDB. Con `reimportar_archivo` se vuelven a leer todos los archivados.
+    """
     # Conectarse a la base de datos
     client = MongoClient(MONGO_URI)
     db = client[DATABASE_NAME]
     collection = db[COLLECTION_NAME]
+    puntos = db[PUNTOS_COLLECTION_NAME]
+    crear_indices_eventos(collection)
+    crear_indices_geo(puntos)
+    notificaciones = obtener_notificaciones(db)
+    # Tormentas con al menos un snapshot nuevo en esta importación
+    tormentas_actualizadas = set()
+    # Avisos SSE que se publican cuando ya se invalidó el cache de la API
+    pendientes = []
     
     print(f"Conectado a MongoDB. Base de datos: '{DATABASE_NAME}', Colección: '{COLLECTION_NAME}'")
 
-    # Recorrer todas las carpetas de snapshots (ej. '2025-10-11_21-43-38')
-    for snapshot_folder_name in os.listdir(ROOT_DIR):
-        snapshot_path = os.path.join(ROOT_DIR, snapshot_folder_name)
-        
-        if os.path.isdir(snapshot_path):
-            print(f"\n--- Procesando snapshot: {snapshot_folder_name} ---")
-            
-            # Convertir el nombre de la carpeta a un formato de fecha estándar (ISO 8601)
+    # Recorrer todas las carpetas de snapshots (ej. '2025-10-11_21-43-38'), en disco y archivadas.
+    # En orden cronológico, para que el último snapshot procesado sea el más reciente
+    ya_importados = None
+    if not reimportar_archivo:
+        ya_importados = lambda storm_id: set(collection.distinct('_id', {'id': storm_id}))
+    archivos, imagenes_por_carpeta = snapshots_por_carpeta(ya_importados)
+    for snapshot_folder_name in sorted(archivos):
+        print(f"\n--- Procesando snapshot: {snapshot_folder_name} ---")
+
+        # Convertir el nombre de la carpeta a un formato de fecha estándar (ISO 8601)
+        try:
+            # Reemplazamos el primer '_' por 'T' y los '-' por ':' para que sea compatible
+            snapshot_datetime = datetime.strptime(snapshot_folder_name, "%Y-%m-%d_%H-%M-%S")
+        except ValueError:
+            print(f"  [ERROR] El nombre de la carpeta '{snapshot_folder_name}' no tiene el formato esperado. Saltando.")
+            continue
+
+        # Recorrer todos los archivos JSON de 'info_generada'
+        for json_filename, cargar in sorted(archivos[snapshot_folder_name].items()):
             try:
-                # Reemplazamos el primer '_' por 'T' y los '-' por ':' para que sea compatible
-                snapshot_datetime = datetime.strptime(snapshot_folder_name, "%Y-%m-%d_%H-%M-%S")
-            except ValueError:
-                print(f"  [ERROR] El nombre de la carpeta '{snapshot_folder_name}' no tiene el formato esperado. Saltando.")
-                continue
+                data = expandir_columnar(cargar())
+                
+                # El ID del evento que usaremos como clave única en MongoDB
+                event_id = data.get('id')
+                if not event_id:
+                    print(f"  [ERROR] El archivo {json_filename} no tiene una clave 'id'. Saltando.")
+                    continue
+                
+                # Fechas como datetime nativo y el historial ya ordenado
+                normalizar_fechas(data)
 
-            # Ruta a la carpeta de info_generada
-            info_path = os.path.join(snapshot_path, 'info_generada')
-            
-            if not os.path.exists(info_path):
-                print(f"  [AVISO] No se encontró la carpeta 'info_generada' en '{snapshot_folder_name}'.")
-                continue
+                # Trayectorias simplificadas (índices) para las tolerancias estándar de lod=
+                if data.get('history'):
+                    data['history_lod'] = precalcular_lod(data['history'])
 
-            # Recorrer todos los archivos JSON dentro de 'info_generada'
-            for json_filename in os.listdir(info_path):
-                if json_filename.endswith('.json'):
-                    file_path = os.path.join(info_path, json_filename)
-                    
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                        
-                        # El ID del evento que usaremos como clave única en MongoDB
-                        event_id = data.get('id')
-                        if not event_id:
-                            print(f"  [ERROR] El archivo {json_filename} no tiene una clave 'id'. Saltando.")
-                            continue
-                        
-                        # Añadimos la fecha del snapshot al documento
-                        data['snapshot_timestamp'] = snapshot_datetime
-                        
-                        # La magia sucede aquí: "update_one" con "upsert=True"
-                        # - Busca un documento con el mismo "_id".
-                        # - Si lo encuentra, lo reemplaza con los nuevos datos ($set).
-                        # - Si NO lo encuentra, lo inserta como un nuevo documento (upsert=True).
-                        # Esto asegura que siempre tengas la versión más reciente de cada evento.
-                        unique_doc_id = f"{event_id}_{snapshot_folder_name}"
-
-                        data['snapshot_timestamp'] = snapshot_datetime
-
-                        collection.update_one(
-                            {'_id': unique_doc_id},
-                            {'$set': data},
-                            upsert=True
-                        )
-                        print(f"  [OK] Procesado y guardado snapshot: {event_id} de la carpeta {snapshot_folder_name}")
-
-                        
-                    except json.JSONDecodeError:
-                        print(f"  [ERROR] El archivo {json_filename} no es un JSON válido.")
-                    except Exception as e:
-                        print(f"  [ERROR] Ocurrió un error inesperado con {json_filename}: {e}")
+                # Añadimos la fecha del snapshot al documento
+                data['snapshot_timestamp'] = snapshot_datetime
+                
+                # La magia sucede aquí: "update_one" con "upsert=True"
+                # - Busca un documento con el mismo "_id".
+                # - Si lo encuentra, lo reemplaza con los nuevos datos ($set).
+                # - Si NO lo encuentra, lo inserta como un nuevo documento (upsert=True).
+                # Esto asegura que siempre tengas la versión más reciente de cada evento.
+                unique_doc_id = f"{event_id}_{snapshot_folder_name}"
+
+                data['snapshot_timestamp'] = snapshot_datetime
+
+                resultado = collection.update_one(
+                    {'_id': unique_doc_id},
+                    {'$set': data},
+                    upsert=True
+                )
+                print(f"  [OK] Procesado y guardado snapshot: {event_id} de la carpeta {snapshot_folder_name}")
+
+                # Solo avisamos de snapshots nuevos, no de re-importaciones
+                if resultado.upserted_id is not None:
+                    imagenes = urls_imagenes(snapshot_folder_name, event_id,
+                                             imagenes_por_carpeta.get(snapshot_folder_name, []))
+                    pendientes.append(notificacion_snapshot(collection, data, unique_doc_id,
+                                                            snapshot_datetime, imagenes))
+                    tormentas_actualizadas.add(event_id)
+
+                n_puntos = indexar_puntos(puntos, data, snapshot_datetime)
+                if n_puntos:
+                    print(f"  [OK] {n_puntos} puntos de trayectoria indexados para {event_id}")
+
+                
+            except json.JSONDecodeError:
+                print(f"  [ERROR] El archivo {json_filename} no es un JSON válido.")
+            except Exception as e:
+                print(f"  [ERROR] Ocurrió un error inesperado con {json_filename}: {e}")
 
     print("\n--- Proceso de importación finalizado. ---")
+
+    if tormentas_actualizadas:
+        # La API deja de servir las lecturas en cache de antes de esta importación.
+        # Primero se invalida y luego se avisa, para que un cliente que reaccione
+        # al aviso ya lea los datos nuevos.
+        generacion = CacheCompartido().invalidar()
+        print(f"Cache compartido de la API invalidado (generación {generacion}).")
+    if pendientes:
+        notificaciones.insert_many(pendientes, ordered=True)
+        print(f"  [OK] {len(pendientes)} notificaciones publicadas")
     client.close()
+    lanzar_precalculo(tormentas_actualizadas)
 
 # Ejecutar la función principal
 if __name__ == '__main__':
-    procesar_datos()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Importa los snapshots de datos/ (y de archivo/) a MongoDB.")
+    parser.add_argument('--reimportar-archivo', action='store_true',
+                        help="Vuelve a importar todos los snapshots archivados, aunque ya estén en MongoDB")
+    args = parser.parse_args()
+    procesar_datos(args.reimportar_archivo)